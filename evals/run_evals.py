@@ -5,7 +5,9 @@ Tests the agent against the evaluation dataset and reports results.
 
 import sys
 import os
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
 
 from langsmith import Client
 from langsmith.evaluation import evaluate
@@ -22,9 +22,26 @@ from src.agent import get_agent
 from src.memory import memory_manager
 from src.config import config
 
+try:
+    import uvloop
+except ImportError:  # Optional; the default asyncio loop is used instead
+    uvloop = None
+
 
 console = Console()
 
+# One event loop for the whole CLI session, so the agent's pooled HTTP
+# connections stay alive between messages; uvloop when it's installed
+_runner: Optional[asyncio.Runner] = None
+
+
+def run_async(coro):
+    """Run a coroutine to completion on the CLI's long-lived event loop."""
+    global _runner
+    if _runner is None:
+        _runner = asyncio.Runner(loop_factory=uvloop.new_event_loop if uvloop else None)
+    return _runner.run(coro)
+
 
 def print_agentcode_ascii(
     console: Console,
@@ -217,7 +234,7 @@ def handle_command(command: str) -> str:
             agent = get_agent()
             console.print("[dim]Processing...[/dim]")
             try:
-                response = agent.process_message(user_input)
+                response = run_async(agent.aprocess_message(user_input))
                 formatted_response = format_agent_response(response)
                 console.print(Panel(formatted_response, title="Agent", border_style="green"))
             except Exception as e:
@@ -237,22 +254,18 @@ async def process_streaming_response(agent, user_input: str):
     """Process agent response with streaming for real-time feedback."""
     console.print("[dim]Processing...[/dim]\n")
     
-    response_text = ""
     current_tool = None
     
+    async def print_token(token: str):
+        # Stream tokens as they arrive
+        console.print(token, end="", style="green")
+    
     try:
-        async for event in agent.astream_response(user_input):
+        async for event in agent.astream_response(user_input, on_token=print_token):
             event_type = event.get("event")
             
             # Handle different event types
-            if event_type == "on_chat_model_stream":
-                # Stream tokens as they arrive
-                content = event["data"]["chunk"].content
-                if content:
-                    console.print(content, end="", style="green")
-                    response_text += content
-            
-            elif event_type == "on_tool_start":
+            if event_type == "on_tool_start":
                 # Show tool invocation
                 tool_name = event.get("name", "unknown")
                 current_tool = tool_name
@@ -363,11 +376,11 @@ def main(session_id: Optional[str], model: str, stream: bool):
             try:
                 if stream:
                     # Use streaming mode
-                    asyncio.run(process_streaming_response(agent, user_input))
+                    run_async(process_streaming_response(agent, user_input))
                 else:
                     # Use non-streaming mode
                     console.print("[dim]Processing...[/dim]")
-                    response = agent.process_message(user_input)
+                    response = run_async(agent.aprocess_message(user_input))
                     
                     # Display response
                     formatted_response = format_agent_response(response)
@@ -382,6 +395,9 @@ def main(session_id: Optional[str], model: str, stream: bool):
             console.print("\n[yellow]Use 'quit' to exit gracefully[/yellow]")
         except Exception as e:
             console.print(f"[red]Unexpected error: {e}[/red]")
+    
+    if _runner is not None:
+        _runner.close()
 
 
 if __name__ == "__main__":
@@ -7,8 +7,10 @@ Simple launcher that imports and runs the CLI interface.
 import sys
 import os
 
-# Add the src directory to Python path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+# Add the src directory to Python path (once, even if this module is re-imported)
+SRC_DIR = os.path.join(os.path.dirname(__file__), 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
 
 from interface.cli import main
 
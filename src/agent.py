@@ -4,26 +4,232 @@ Simplified version without LangGraph for MVP testing.
 """
 
 import os
+import re
+import time
 import uuid
-from typing import Dict, Any, List, AsyncIterator, Optional
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, AsyncIterator, Awaitable, Callable, Optional
 from datetime import datetime
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain.agents import create_tool_calling_agent, AgentExecutor
-from langchain.prompts import ChatPromptTemplate
-from langsmith import traceable
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, BaseMessage
+from langchain_core.callbacks import BaseCallbackHandler
 
 from .tools import TOOLS
-from .state import AgentState, create_initial_state, update_state_timestamp, reset_retry_state, increment_retry_count
-from .memory import memory_manager
+from .state import AgentState, create_initial_state, update_state_timestamp, reset_retry_state, increment_retry_count, truncate_error, format_timestamp
+from .memory import memory_manager, load_encoder, count_tokens
 from .config import config
 
 
+# Static system prompt. Kept first and byte-identical across turns so the
+# provider's automatic prefix cache can reuse it instead of reprocessing it.
+SYSTEM_PROMPT = """You are a helpful coding assistant. You can create, read, edit, and execute files.
+
+WORKSPACE CONTEXT:
+- You are working in a dedicated workspace directory
+- All files you create are stored in this workspace
+- Commands (like pytest, python, etc.) execute FROM the workspace directory
+- When running commands, use relative paths from the workspace (e.g., "pytest calculator/tests.py")
+
+AVAILABLE TOOLS:
+
+File Operations:
+- write_file: Create or overwrite files (paths are relative to workspace)
+- read_file: Read file contents (paths are relative to workspace)
+- edit_file: Modify existing files (paths are relative to workspace)
+- run_command: Execute shell commands (runs IN the workspace directory)
+  * By default, captures output for return value and error handling
+  * Use show_output=True for interactive/monitoring tools (dashboards, monitors, live displays)
+    to stream output directly to terminal in real-time
+  * Examples: run_command("python monitor.py", show_output=True) for dashboards
+             run_command("pytest tests.py") for normal commands (captures output)
+  WARNING: Scripts with input() will hang! Modify them to accept arguments instead.
+  Example: Instead of input("Enter n:"), use sys.argv or provide test values.
+- list_files: List files matching a pattern
+- file_exists: Check if a file exists
+- get_file_info: Get file metadata
+
+PARALLEL TOOL CALLS:
+- Tool calls requested together in one step run concurrently
+- When calls don't depend on each other (e.g. git_status + git_diff + git_log, or reading
+  several files), request them together instead of one at a time
+- Keep dependent steps sequential (e.g. write_file before run_command on that file)
+
+Directory Navigation:
+- get_current_directory: Show current workspace path (like pwd)
+- list_directory: List contents of a directory with details (like ls)
+- change_workspace_context: Explore a different directory and see its contents
+
+Git Operations:
+- git_status: Check current git status and see modified/untracked files
+- git_create_branch: Create a new branch with 'agent/' prefix (e.g., agent/calculator)
+- git_checkout_branch: Switch to an existing branch
+- git_list_branches: List all local branches
+- git_diff: Show changes in working directory
+- git_stage_files: Stage files for commit (or stage all with no args)
+- git_commit: Commit staged changes with a message
+- git_push: Push branch to remote (REQUIRES USER CONFIRMATION - show changes first!)
+- git_pull: Pull latest changes from remote
+- git_log: Show recent commit history
+- git_show_commit: Show details of a specific commit
+- git_branch_summary: Get current branch status and remote tracking info
+
+GIT WORKFLOW:
+When making code changes that should be committed:
+1. Check status: git_status()
+2. Create feature branch: git_create_branch("descriptive-name")
+3. Make your file changes (write_file, edit_file, etc.)
+4. Stage changes: git_stage_files() or git_stage_files(["specific/file.py"])
+5. Show diff: git_diff() - review what will be committed
+6. Commit: git_commit("Clear description of changes")
+7. Show what will be pushed: git_log(limit=5)
+8. Ask user for permission to push
+9. If approved: git_push()
+
+IMPORTANT GIT RULES:
+- NEVER commit directly to main/master/develop branches
+- ALWAYS create a feature branch first (agent/feature-name)
+- ALWAYS show git_diff() before committing
+- ALWAYS show git_log() before pushing
+- NEVER auto-push without user confirmation
+- Branch names should be descriptive: agent/calculator, agent/data-pipeline, etc.
+
+CONVERSATION CONTEXT:
+- When users reference files from previous messages (like "that file" or "operations.py"), 
+  look at the conversation history to find the exact file path you used before
+- Remember what files you've created and where they are
+
+Always provide clear feedback about what you're doing."""
+
+# Task-type trace tags and the user-input keywords that trigger them
+TAG_KEYWORDS: Dict[str, frozenset] = {
+    "git-operation": frozenset({"git", "commit", "push", "branch", "pull"}),
+    "file-creation": frozenset({"create", "write", "make", "generate"}),
+    "file-reading": frozenset({"read", "show", "display", "view", "check"}),
+    "file-editing": frozenset({"edit", "modify", "update", "change", "fix"}),
+    "command-execution": frozenset({"run", "execute", "test", "pytest"}),
+    "package-management": frozenset({"install", "pip", "package", "dependency"}),
+}
+_KW_TO_TAG: Dict[str, str] = {word: tag for tag, words in TAG_KEYWORDS.items() for word in words}
+_TAG_RE = re.compile(r"\b(?:" + "|".join(sorted(_KW_TO_TAG)) + r")\b")
+
+# Markers that identify a failed tool call in its output. Plain substring
+# checks: CPython's `in` search beats a compiled alternation over the same text.
+_TOOL_ERROR_MARKERS = ("Error:", "failed with exit code", "Traceback")
+
+
+def _is_tool_error(output: str) -> bool:
+    """Return True if a tool's string output reports a failure."""
+    return any(marker in output for marker in _TOOL_ERROR_MARKERS)
+
+
+# Runs of whitespace, collapsed when keying the response cache
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Runnable types whose astream_events are forwarded to callers (token stream and
+# tool start/end); internal chain/prompt/parser events are never emitted
+STREAMED_RUN_TYPES = ["chat_model", "tool"]
+
+# Tags for the most common turn shape: simple, successful, fast, one tool call
+_DEFAULT_TAGS_SIMPLE_SUCCESS_SINGLE_TOOL = ("simple-query", "success", "fast", "single-turn", "single-tool")
+
+
+# Read once at import: with tracing off, tagging and @traceable cost nothing
+_LANGSMITH_ENABLED = config.get_langsmith_enabled()
+if _LANGSMITH_ENABLED:
+    from langsmith import get_current_run_tree
+
+
+def traceable(**kwargs):
+    """LangSmith's @traceable, imported lazily and only when tracing is enabled.
+    
+    Falls back to a no-op decorator so importing this module doesn't pull in
+    the LangSmith client when tracing is off.
+    """
+    if not _LANGSMITH_ENABLED:
+        return lambda fn: fn
+    
+    from langsmith import traceable as langsmith_traceable
+    return langsmith_traceable(**kwargs)
+
+
+# Prompt template, OpenAI tool schemas and async HTTP client shared by every
+# CodingAgent, built on first use
+_PROMPT = None
+_TOOL_SCHEMAS = None
+_shared_http_client = None
+
+# Event loop behind the synchronous process_message. The pooled HTTP client's
+# connections belong to the loop that opened them, so every call must reuse
+# one loop rather than creating (and closing) a new one per message.
+_sync_runner: Optional[asyncio.Runner] = None
+
+
+def _get_shared_llm_resources():
+    """Return the module-wide prompt template, tool schemas and pooled async HTTP client.
+    
+    Agents built later (new sessions, test harnesses) reuse all three instead
+    of rebuilding the template, re-deriving every tool's JSON schema from its
+    signature and docstring, and opening a fresh connection pool, so kept-alive
+    connections skip the TCP and TLS handshakes.
+    """
+    global _PROMPT, _TOOL_SCHEMAS, _shared_http_client
+    if _PROMPT is None:
+        import httpx
+        from langchain.prompts import ChatPromptTemplate
+        from langchain_core.utils.function_calling import convert_to_openai_tool
+        
+        _TOOL_SCHEMAS = [convert_to_openai_tool(t) for t in TOOLS]
+        
+        _PROMPT = ChatPromptTemplate.from_messages([
+            ("system", SYSTEM_PROMPT),
+            ("placeholder", "{chat_history}"),
+            ("human", "{input}"),
+            ("placeholder", "{agent_scratchpad}"),
+        ])
+        _shared_http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+    return _PROMPT, _TOOL_SCHEMAS, _shared_http_client
+
+
+class _TurnTracker(BaseCallbackHandler):
+    """Callback that collects token usage, tool calls and tool-call concurrency across a turn."""
+    
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.max_concurrency = 0  # Most tool calls requested in a single LLM step
+        self.tool_calls = 0  # Counted as tools start, so the executor needn't return its steps
+    
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.tool_calls += 1
+    
+    def on_llm_end(self, response, **kwargs):
+        if not response.generations or not response.generations[0]:
+            return
+        message = getattr(response.generations[0][0], "message", None)
+        usage = getattr(message, "usage_metadata", None) or {}
+        self.prompt_tokens += usage.get("input_tokens", 0)
+        self.cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0)
+        
+        # Tool calls from the same step run concurrently in the async executor
+        self.max_concurrency = max(self.max_concurrency, len(getattr(message, "tool_calls", None) or []))
+
+
 class CodingAgent:
     """Main coding agent using LangChain tools."""
     
     def __init__(self, model_name: str = None, temperature: float = None):
         """Initialize the coding agent."""
+        # Heavy LLM dependencies are imported here so CLI paths that never
+        # build an agent (--help, session listing) don't pay for them
+        from langchain_openai import ChatOpenAI
+        from langchain.agents import create_tool_calling_agent, AgentExecutor
+        
+        prompt, tool_schemas, http_client = _get_shared_llm_resources()
+        
         # Use config values if not provided
         model_config = config.get_model_config()
         model_name = model_name or model_config["model_name"]
@@ -32,93 +238,42 @@ class CodingAgent:
         self.model = ChatOpenAI(
             model=model_name,
             temperature=temperature,
-            api_key=config.get_openai_api_key()
+            api_key=config.get_openai_api_key(),
+            http_async_client=http_client,
+            stream_usage=True  # Report token usage (incl. cached tokens) when streaming
         )
         
-        # Create a simple prompt template
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a helpful coding assistant. You can create, read, edit, and execute files.
-            
-            WORKSPACE CONTEXT:
-            - You are working in a dedicated workspace directory
-            - All files you create are stored in this workspace
-            - Commands (like pytest, python, etc.) execute FROM the workspace directory
-            - When running commands, use relative paths from the workspace (e.g., "pytest calculator/tests.py")
-            
-            AVAILABLE TOOLS:
-            
-            File Operations:
-            - write_file: Create or overwrite files (paths are relative to workspace)
-            - read_file: Read file contents (paths are relative to workspace)
-            - edit_file: Modify existing files (paths are relative to workspace)
-            - run_command: Execute shell commands (runs IN the workspace directory)
-              * By default, captures output for return value and error handling
-              * Use show_output=True for interactive/monitoring tools (dashboards, monitors, live displays)
-                to stream output directly to terminal in real-time
-              * Examples: run_command("python monitor.py", show_output=True) for dashboards
-                         run_command("pytest tests.py") for normal commands (captures output)
-              WARNING: Scripts with input() will hang! Modify them to accept arguments instead.
-              Example: Instead of input("Enter n:"), use sys.argv or provide test values.
-            - list_files: List files matching a pattern
-            - file_exists: Check if a file exists
-            - get_file_info: Get file metadata
-            
-            Directory Navigation:
-            - get_current_directory: Show current workspace path (like pwd)
-            - list_directory: List contents of a directory with details (like ls)
-            - change_workspace_context: Explore a different directory and see its contents
-            
-            Git Operations:
-            - git_status: Check current git status and see modified/untracked files
-            - git_create_branch: Create a new branch with 'agent/' prefix (e.g., agent/calculator)
-            - git_checkout_branch: Switch to an existing branch
-            - git_list_branches: List all local branches
-            - git_diff: Show changes in working directory
-            - git_stage_files: Stage files for commit (or stage all with no args)
-            - git_commit: Commit staged changes with a message
-            - git_push: Push branch to remote (REQUIRES USER CONFIRMATION - show changes first!)
-            - git_pull: Pull latest changes from remote
-            - git_log: Show recent commit history
-            - git_show_commit: Show details of a specific commit
-            - git_branch_summary: Get current branch status and remote tracking info
-            
-            GIT WORKFLOW:
-            When making code changes that should be committed:
-            1. Check status: git_status()
-            2. Create feature branch: git_create_branch("descriptive-name")
-            3. Make your file changes (write_file, edit_file, etc.)
-            4. Stage changes: git_stage_files() or git_stage_files(["specific/file.py"])
-            5. Show diff: git_diff() - review what will be committed
-            6. Commit: git_commit("Clear description of changes")
-            7. Show what will be pushed: git_log(limit=5)
-            8. Ask user for permission to push
-            9. If approved: git_push()
-            
-            IMPORTANT GIT RULES:
-            - NEVER commit directly to main/master/develop branches
-            - ALWAYS create a feature branch first (agent/feature-name)
-            - ALWAYS show git_diff() before committing
-            - ALWAYS show git_log() before pushing
-            - NEVER auto-push without user confirmation
-            - Branch names should be descriptive: agent/calculator, agent/data-pipeline, etc.
-            
-            CONVERSATION CONTEXT:
-            - When users reference files from previous messages (like "that file" or "operations.py"), 
-              look at the conversation history to find the exact file path you used before
-            - Remember what files you've created and where they are
-            
-            Always provide clear feedback about what you're doing."""),
-            ("placeholder", "{chat_history}"),
-            ("human", "{input}"),
-            ("placeholder", "{agent_scratchpad}"),
-        ])
-        
-        # Create the agent
-        agent = create_tool_calling_agent(self.model, TOOLS, prompt)
+        # Create the agent; binding the precomputed schemas skips per-agent tool conversion
+        agent = create_tool_calling_agent(self.model, tool_schemas, prompt)
         self.agent_executor = AgentExecutor(agent=agent, tools=TOOLS, verbose=True)
         
         self.current_session_id = None
         self.current_state = None
+        
+        # Token counts are computed once per message, in a list parallel to
+        # current_state["messages"], so history trimming never re-tokenizes
+        self._encoder = load_encoder(model_name)
+        self._system_tokens = count_tokens(SYSTEM_PROMPT, self._encoder)
+        self._token_counts: List[int] = []
+        
+        # LRU cache of final answers for deterministic, tool-free turns
+        self._response_cache: "OrderedDict[str, str]" = OrderedDict()
+        
+        self.reload_config()
+    
+    def reload_config(self):
+        """Re-read the per-turn settings from config.
+        
+        They're cached on the instance so the retry and streaming loops don't
+        go back to config on every message; call this after changing config.
+        """
+        self._max_retries = config.get_max_retry()
+        self._auto_retry = config.get_auto_retry_enabled()
+        self._max_history = config.get_max_history_messages()
+        self._max_history_tokens = config.get_max_history_tokens()
+        self._summarize_history = config.get_summarize_history()
+        self._summary_trigger_tokens = config.get_summary_trigger_tokens()
+        self._response_cache_size = config.get_response_cache_size()
     
     def start_session(self, session_id: str = None) -> str:
         """Start a new conversation session."""
@@ -126,6 +281,7 @@ class CodingAgent:
             session_id = str(uuid.uuid4())
         
         self.current_session_id = session_id
+        self._token_counts = []
         
         # Try to load existing state, or create new one
         self.current_state = memory_manager.load_state(session_id)
@@ -134,6 +290,59 @@ class CodingAgent:
         
         return session_id
     
+    def _response_cache_key(self, chat_history: List[BaseMessage], user_input: str) -> Optional[str]:
+        """Exact-match cache key for a deterministic turn, or None when caching doesn't apply.
+        
+        Only temperature 0 turns are cacheable. The key covers everything that
+        shapes the model's answer: model, system prompt, tools, history and input.
+        Whitespace in the input is normalized, so requests differing only in
+        spacing share an entry; case and punctuation are kept since they can
+        be significant in file names and code.
+        """
+        if self.model.temperature != 0 or self._response_cache_size <= 0:
+            return None
+        
+        digest = hashlib.sha256()
+        parts = [self.model.model_name, SYSTEM_PROMPT, *sorted(t.name for t in TOOLS)]
+        parts.extend(f"{type(msg).__name__}:{msg.content}" for msg in chat_history)
+        parts.append(_WHITESPACE_RE.sub(" ", user_input).strip())
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+    
+    async def _build_chat_history(self) -> List[BaseMessage]:
+        """Return the most recent history messages, excluding the message just added.
+        
+        Takes messages from newest to oldest while they fit in the token budget
+        left after the system prompt and the input, capped at the message-count
+        window. Older messages are represented by a rolling summary, prepended
+        as a system message.
+        """
+        messages = self.current_state["messages"]
+        token_counts = self._token_counts
+        for msg in messages[len(token_counts):]:
+            token_counts.append(count_tokens(str(msg.content), self._encoder))
+        
+        end = len(messages) - 1
+        floor = max(0, end - self._max_history)
+        budget = self._max_history_tokens - self._system_tokens - token_counts[end]
+        start = end
+        while start > floor and token_counts[start - 1] <= budget:
+            start -= 1
+            budget -= token_counts[start]
+        history = messages[start:end]
+        
+        if self._summarize_history and start > 0:
+            summary = await memory_manager.summarize_if_needed(
+                self.current_state, start, self._summary_trigger_tokens, token_counts,
+                http_client=self.model.http_async_client
+            )
+            if summary:
+                history.insert(0, SystemMessage.model_construct(content=f"Summary of earlier conversation:\n{summary}"))
+        
+        return history
+    
     def _extract_tool_errors(self, response: Dict[str, Any]) -> Optional[Dict[str, str]]:
         """Extract tool errors from agent response intermediate steps.
         
@@ -144,7 +353,7 @@ class CodingAgent:
             # Tool errors come back as string observations containing error markers
             if isinstance(observation, str):
                 # Check for our error format from run_command and other tools
-                if "Error:" in observation or "failed with exit code" in observation or "Traceback" in observation:
+                if _is_tool_error(observation):
                     return {
                         "error": observation,
                         "error_type": "ToolExecutionError",
@@ -162,7 +371,7 @@ class CodingAgent:
         - How to approach the fix
         """
         retry_count = self.current_state.get("retry_count", 0)
-        max_retries = config.get_max_retry()
+        max_retries = self._max_retries
         retry_history = self.current_state.get("retry_history", [])
         
         feedback = f"""🔄 RETRY ATTEMPT {retry_count} of {max_retries}
@@ -174,17 +383,22 @@ ORIGINAL USER REQUEST:
 
 ERROR DETAILS:
 - Error Type: {error_info.get('error_type', 'Unknown')}
-- Error Message: {error_info.get('error', 'Unknown error')}
+- Error Message: {truncate_error(error_info.get('error', 'Unknown error'))}
 """
         
+        # Collected as parts and joined once rather than concatenated per attempt
+        parts = [feedback]
+        
         # Add previous retry attempts to avoid repeating mistakes
         if len(retry_history) > 1:
-            feedback += "\nPREVIOUS ATTEMPTS THAT FAILED:\n"
-            for attempt in retry_history[:-1]:  # Exclude current attempt
-                feedback += f"  Attempt {attempt['attempt']}: {attempt['error_type']} - {attempt['error'][:100]}\n"
-            feedback += "\n⚠️  Do NOT repeat the same approach. Try something different.\n"
+            parts.append("\nPREVIOUS ATTEMPTS THAT FAILED:\n")
+            parts.extend(
+                f"  Attempt {attempt['attempt']}: {attempt['error_type']} - {attempt['error'][:100]}\n"
+                for attempt in retry_history[:-1]  # Exclude current attempt
+            )
+            parts.append("\n⚠️  Do NOT repeat the same approach. Try something different.\n")
         
-        feedback += """
+        parts.append("""
 INSTRUCTIONS:
 1. Carefully read the error message above
 2. Identify the root cause of the failure
@@ -200,101 +414,93 @@ Examples of what to check:
 - Wrong tool usage (use the correct tool or parameters)
 
 Please proceed with your fix and retry.
-"""
+""")
         
-        return feedback
+        return "".join(parts)
     
-    def _add_trace_tags_and_metadata(self, user_input: str, response: str, latency: float, success: bool, error_type: str = None, tool_call_count: int = 0):
+    def _add_trace_tags_and_metadata(self, user_input: str, response: str, latency: float, success: bool, error_type: str = None, tool_call_count: int = 0, usage: _TurnTracker = None, cache_hit: Optional[bool] = None):
         """Add intelligent tags and metadata to LangSmith trace for filtering and analysis."""
+        if not _LANGSMITH_ENABLED:
+            return
+        
         try:
-            from langsmith import get_current_run_tree
-            
             run = get_current_run_tree()
             if not run:
                 return
             
             tags = []
             user_lower = user_input.lower()
-            response_lower = response.lower()
-            
-            # Task type tags
-            if any(word in user_lower for word in ["git", "commit", "push", "branch", "pull"]):
-                tags.append("git-operation")
-            
-            if any(word in user_lower for word in ["create", "write", "make", "generate"]):
-                tags.append("file-creation")
             
-            if any(word in user_lower for word in ["read", "show", "display", "view", "check"]):
-                tags.append("file-reading")
+            # Task type tags: one regex pass over the input for every category's keywords
+            hits = {_KW_TO_TAG[word] for word in _TAG_RE.findall(user_lower)}
+            tags.extend(tag for tag in TAG_KEYWORDS if tag in hits)
             
-            if any(word in user_lower for word in ["edit", "modify", "update", "change", "fix"]):
-                tags.append("file-editing")
+            state = self.current_state
+            message_count = len(state["messages"]) if state else 0
+            retry_count = state.get("retry_count", 0) if state else 0
+            is_complex = len(user_input.split()) > 30 or "multi" in user_lower
+            is_multi_turn = message_count > 2
             
-            if any(word in user_lower for word in ["run", "execute", "test", "pytest"]):
-                tags.append("command-execution")
-            
-            if any(word in user_lower for word in ["install", "pip", "package", "dependency"]):
-                tags.append("package-management")
-            
-            # Complexity tags
-            if len(user_input.split()) > 30 or "multi" in user_lower:
-                tags.append("complex-query")
-            else:
-                tags.append("simple-query")
-            
-            # Success/Error tags
-            if success:
-                tags.append("success")
-            else:
-                tags.append("error")
-                if error_type:
-                    tags.append(f"error-{error_type}")
-            
-            # Performance tags
-            if latency > 10:
-                tags.append("slow")
-            elif latency < 3:
-                tags.append("fast")
-            
-            # Multi-turn conversation tag
-            if self.current_state and len(self.current_state["messages"]) > 2:
-                tags.append("multi-turn")
-            else:
-                tags.append("single-turn")
-            
-            # Tool usage tags
-            if tool_call_count == 0:
-                tags.append("no-tools")
-            elif tool_call_count == 1:
-                tags.append("single-tool")
+            # Fast path: most turns share the same shape, so reuse the frozen tag set
+            if (success and not is_complex and not is_multi_turn and tool_call_count == 1
+                    and latency < 3 and retry_count == 0):
+                tags.extend(_DEFAULT_TAGS_SIMPLE_SUCCESS_SINGLE_TOOL)
             else:
-                tags.append("multi-tool")
-            
-            # Retry tags
-            retry_count = self.current_state.get("retry_count", 0) if self.current_state else 0
-            if retry_count > 0:
-                tags.append("auto-retry")
-                tags.append(f"retry-count-{retry_count}")
+                # Complexity tags
+                tags.append("complex-query" if is_complex else "simple-query")
+                
+                # Success/Error tags
                 if success:
-                    tags.append("retry-recovered")
+                    tags.append("success")
+                else:
+                    tags.append("error")
+                    if error_type:
+                        tags.append(f"error-{error_type}")
+                
+                # Performance tags
+                if latency > 10:
+                    tags.append("slow")
+                elif latency < 3:
+                    tags.append("fast")
+                
+                # Multi-turn conversation tag
+                tags.append("multi-turn" if is_multi_turn else "single-turn")
+                
+                # Tool usage tags
+                if tool_call_count == 0:
+                    tags.append("no-tools")
+                elif tool_call_count == 1:
+                    tags.append("single-tool")
                 else:
-                    tags.append("retry-exhausted")
+                    tags.append("multi-tool")
+                
+                if usage and usage.max_concurrency > 1:
+                    tags.append("parallel-tools")
+                
+                # Retry tags
+                if retry_count > 0:
+                    tags.append("auto-retry")
+                    tags.append(f"retry-count-{retry_count}")
+                    if success:
+                        tags.append("retry-recovered")
+                    else:
+                        tags.append("retry-exhausted")
             
-            # Add all tags
-            for tag in tags:
-                run.add_tags([tag])
+            # Response cache tags (only for cacheable turns)
+            if cache_hit is not None:
+                tags.append("cache-hit" if cache_hit else "cache-miss")
             
-            # Add custom metadata
-            message_count = len(self.current_state["messages"]) if self.current_state else 0
-            files_in_context = len(self.current_state.get("current_files", {})) if self.current_state else 0
+            # Add all tags in a single call
+            run.add_tags(tags)
             
-            retry_count = self.current_state.get("retry_count", 0) if self.current_state else 0
+            # Add custom metadata
+            files_in_context = len(state.get("current_files", {})) if state else 0
             
             metadata = {
                 "session_id": self.current_session_id,
                 "turn_number": message_count // 2,
                 "message_count": message_count,
-                "has_conversation_history": message_count > 2,  # More than just current exchange
+                "has_conversation_history": is_multi_turn,  # More than just current exchange
                 "files_in_context": files_in_context,
                 "has_file_context": files_in_context > 0,
                 "tool_call_count": tool_call_count,
@@ -306,26 +512,46 @@ Please proceed with your fix and retry.
                 "response_length": len(response),
                 "retry_count": retry_count,
                 "had_retries": retry_count > 0,
-                "auto_retry_enabled": config.get_auto_retry_enabled()
+                "auto_retry_enabled": self._auto_retry
             }
             
             if error_type:
                 metadata["error_type"] = error_type
             
+            if usage:
+                metadata["max_concurrency"] = usage.max_concurrency
+            
+            # Prompt cache effectiveness for the static system prompt prefix
+            if usage and usage.prompt_tokens:
+                metadata["prompt_tokens"] = usage.prompt_tokens
+                metadata["cached_tokens"] = usage.cached_tokens
+                metadata["cache_hit_rate"] = usage.cached_tokens / usage.prompt_tokens
+            
             run.add_metadata(metadata)
             
         except Exception as e:
             # Silently fail if tagging doesn't work - don't break the main flow
             pass
     
-    @traceable(run_type="chain", name="process_message")
     def process_message(self, user_input: str) -> Dict[str, Any]:
-        """Process a user message and return agent response with automatic retry on errors."""
+        """Process a user message synchronously (wrapper around aprocess_message for scripts and evals)."""
+        global _sync_runner
+        if _sync_runner is None:
+            _sync_runner = asyncio.Runner()
+        return _sync_runner.run(self.aprocess_message(user_input))
+    
+    @traceable(run_type="chain", name="process_message")
+    async def aprocess_message(self, user_input: str) -> Dict[str, Any]:
+        """Process a user message and return agent response with automatic retry on errors.
+        
+        Runs the agent executor on the event loop so concurrent sessions can
+        progress while one is waiting on the LLM or a tool.
+        """
         if not self.current_session_id:
             self.start_session()
         
         # Track start time for latency metrics
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         
         # Reset retry state for new user message
         self.current_state = reset_retry_state(self.current_state)
@@ -334,32 +560,40 @@ Please proceed with your fix and retry.
         original_user_input = user_input
         
         # Add user message to state (only once, before any retries)
-        self.current_state["messages"].append(HumanMessage(content=user_input))
+        self.current_state["messages"].append(HumanMessage.model_construct(content=user_input))
         
         # Get max retry settings
-        max_retries = config.get_max_retry()
-        auto_retry_enabled = config.get_auto_retry_enabled()
+        max_retries = self._max_retries
+        auto_retry_enabled = self._auto_retry
+        
+        # Track token usage, tool calls and tool concurrency across this turn
+        usage = _TurnTracker()
         
         # Retry loop
         last_error = None
         while True:
             try:
+                tool_calls_before = usage.tool_calls
+                
                 # Get chat history with sliding window to prevent token overflow
-                # Exclude the current message we just added (and any retry messages)
-                max_history = config.get_max_history_messages()
-                all_messages = self.current_state["messages"][:-1]
+                chat_history = await self._build_chat_history()
                 
-                # Apply sliding window - take only recent messages
-                if len(all_messages) > max_history:
-                    chat_history = all_messages[-max_history:]
-                else:
-                    chat_history = all_messages
+                # Deterministic turns may be answered from the response cache
+                cache_key = self._response_cache_key(chat_history, user_input)
+                cached_text = self._response_cache.get(cache_key) if cache_key else None
                 
-                # Process with the agent executor, passing chat history
-                response = self.agent_executor.invoke({
-                    "input": user_input,  # Use current input (original or retry feedback)
-                    "chat_history": chat_history
-                })
+                if cached_text is not None:
+                    self._response_cache.move_to_end(cache_key)
+                    response = {"output": cached_text}
+                else:
+                    # Process with the agent executor, passing chat history
+                    response = await self.agent_executor.ainvoke(
+                        {
+                            "input": user_input,  # Use current input (original or retry feedback)
+                            "chat_history": chat_history
+                        },
+                        config={"callbacks": [usage]}
+                    )
                 
                 # Check if any tools failed (even though invoke succeeded)
                 tool_error = self._extract_tool_errors(response)
@@ -370,21 +604,30 @@ Please proceed with your fix and retry.
                 # Extract the response
                 response_text = response.get("output", "No response generated")
                 
-                # Count tool calls from intermediate steps
-                tool_call_count = 0
-                if "intermediate_steps" in response:
-                    tool_call_count = len(response["intermediate_steps"])
+                # Tool calls made during this attempt
+                tool_call_count = usage.tool_calls - tool_calls_before
                 
                 # Calculate latency
-                end_time = datetime.now()
-                latency_seconds = (end_time - start_time).total_seconds()
+                latency_seconds = time.perf_counter() - start_time
+                
+                # Cache answers that didn't touch tools; tool results depend on workspace state
+                if cache_key and cached_text is None and usage.max_concurrency == 0:
+                    self._response_cache[cache_key] = response_text
+                    if len(self._response_cache) > self._response_cache_size:
+                        self._response_cache.popitem(last=False)
                 
                 # Add tags and metadata for LangSmith filtering
-                retry_count = self.current_state.get("retry_count", 0)
-                self._add_trace_tags_and_metadata(original_user_input, response_text, latency_seconds, success=True, tool_call_count=tool_call_count)
+                state = self.current_state
+                messages = state["messages"]
+                retry_count = state.get("retry_count", 0)
+                self._add_trace_tags_and_metadata(
+                    original_user_input, response_text, latency_seconds, success=True,
+                    tool_call_count=tool_call_count, usage=usage,
+                    cache_hit=(cached_text is not None) if cache_key else None
+                )
                 
                 # Add AI message to state with rich metadata
-                self.current_state["messages"].append(AIMessage(
+                messages.append(AIMessage.model_construct(
                     content=response_text,
                     additional_kwargs={
                         "model": self.model.model_name,
@@ -397,10 +640,12 @@ Please proceed with your fix and retry.
                 ))
                 
                 # Update state timestamp
-                self.current_state = update_state_timestamp(self.current_state)
+                update_state_timestamp(state)
+                message_count = len(messages)
+                last_updated = state["last_updated"]
                 
-                # Save state
-                memory_manager.save_state(self.current_session_id, self.current_state)
+                # Save state in the background so the response isn't held up by disk I/O
+                memory_manager.save_state_background(self.current_session_id, state)
                 
                 # Success response with retry info if retries occurred
                 result = {
@@ -412,16 +657,16 @@ Please proceed with your fix and retry.
                         "temperature": self.model.temperature,
                         "latency_seconds": latency_seconds,
                         "tool_call_count": tool_call_count,
-                        "turn_number": len(self.current_state["messages"]) // 2,
-                        "session_message_count": len(self.current_state["messages"]),
+                        "turn_number": message_count // 2,
+                        "session_message_count": message_count,
                         "retry_count": retry_count,
-                        "timestamp": self.current_state["last_updated"].isoformat() if hasattr(self.current_state["last_updated"], 'isoformat') else str(self.current_state["last_updated"])
+                        "timestamp": format_timestamp(last_updated)
                     }
                 }
                 
                 # Add retry history to metadata if retries occurred
                 if retry_count > 0:
-                    result["metadata"]["retry_history"] = self.current_state.get("retry_history", [])
+                    result["metadata"]["retry_history"] = state.get("retry_history", [])
                     result["metadata"]["recovered_from_error"] = True
                 
                 return result
@@ -452,18 +697,15 @@ Please proceed with your fix and retry.
                     # Format retry feedback for the agent
                     retry_feedback = self._format_retry_feedback(error_info, original_user_input)
                     
-                    # Update user_input to include error context for retry
+                    # Retry feedback is this attempt's input only; it isn't added to
+                    # the persisted history, so later turns don't keep re-sending it
                     user_input = retry_feedback
                     
-                    # Add retry feedback as a new message for context
-                    self.current_state["messages"].append(HumanMessage(content=retry_feedback))
-                    
                     # Continue to next iteration of retry loop
                     continue
                 else:
                     # No more retries - return error
-                    end_time = datetime.now()
-                    latency_seconds = (end_time - start_time).total_seconds()
+                    latency_seconds = time.perf_counter() - start_time
                     
                     # Add tags for error tracking
                     self._add_trace_tags_and_metadata(original_user_input, str(e), latency_seconds, success=False, error_type=type(e).__name__, tool_call_count=0)
@@ -493,16 +735,22 @@ Please proceed with your fix and retry.
                     
                     return error_response
     
-    async def astream_response(self, user_input: str) -> AsyncIterator[Dict[str, Any]]:
+    async def astream_response(
+        self,
+        user_input: str,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
         """Stream agent response with events for real-time feedback with retry support.
         
         Yields events including:
         - on_chat_model_stream: Token-by-token LLM output
         - on_tool_start: Tool invocation begins
         - on_tool_end: Tool execution completes
-        - on_chain_start/end: Agent reasoning steps
         - on_retry: Retry attempt notification
         
+        If on_token is given, it is awaited with each non-empty token as it
+        arrives so a UI can render tokens without unpacking events.
+        
         Note: LangSmith tracing happens automatically via astream_events.
         The @traceable decorator doesn't work with async generators.
         """
@@ -510,7 +758,7 @@ Please proceed with your fix and retry.
             self.start_session()
         
         # Track start time for latency metrics
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         
         # Reset retry state for new user message
         self.current_state = reset_retry_state(self.current_state)
@@ -519,26 +767,23 @@ Please proceed with your fix and retry.
         original_user_input = user_input
         
         # Add user message to state (only once, before any retries)
-        self.current_state["messages"].append(HumanMessage(content=user_input))
+        self.current_state["messages"].append(HumanMessage.model_construct(content=user_input))
         
         # Get max retry settings
-        max_retries = config.get_max_retry()
-        auto_retry_enabled = config.get_auto_retry_enabled()
+        max_retries = self._max_retries
+        auto_retry_enabled = self._auto_retry
+        
+        # Track token usage and tool concurrency across all LLM calls in this turn
+        usage = _TurnTracker()
         
         # Retry loop
         while True:
             try:
                 # Get chat history with sliding window
-                max_history = config.get_max_history_messages()
-                all_messages = self.current_state["messages"][:-1]
-                
-                if len(all_messages) > max_history:
-                    chat_history = all_messages[-max_history:]
-                else:
-                    chat_history = all_messages
+                chat_history = await self._build_chat_history()
                 
                 # Track response content, tool calls, and errors
-                response_content = ""
+                response_chunks: List[str] = []
                 tool_call_count = 0
                 tool_error = None
                 
@@ -548,31 +793,38 @@ Please proceed with your fix and retry.
                         "input": user_input,
                         "chat_history": chat_history
                     },
-                    version="v1"
+                    config={"callbacks": [usage]},
+                    version="v2",
+                    include_types=STREAMED_RUN_TYPES
                 ):
                     # Yield the event to the caller
                     yield event
                     
+                    kind = event["event"]
+                    
                     # Collect response content from chat model streams
-                    if event["event"] == "on_chat_model_stream":
+                    if kind == "on_chat_model_stream":
                         content = event["data"]["chunk"].content
                         if content:
-                            response_content += content
+                            response_chunks.append(content)
+                            if on_token is not None:
+                                await on_token(content)
                     
                     # Count tool calls and detect errors
-                    elif event["event"] == "on_tool_start":
+                    elif kind == "on_tool_start":
                         tool_call_count += 1
                     
                     # Check tool outputs for errors
-                    elif event["event"] == "on_tool_end":
-                        output = event["data"].get("output", "")
-                        if isinstance(output, str):
-                            if "Error:" in output or "failed with exit code" in output or "Traceback" in output:
-                                tool_error = {
-                                    "error": output,
-                                    "error_type": "ToolExecutionError"
-                                }
+                    elif kind == "on_tool_end":
+                        output = event["data"].get("output")
+                        if isinstance(output, str) and _is_tool_error(output):
+                            tool_error = {
+                                "error": output,
+                                "error_type": "ToolExecutionError"
+                            }
             
+                response_content = "".join(response_chunks)
+                
                 # After streaming completes, check if we should retry
                 if tool_error and auto_retry_enabled:
                     current_retry = self.current_state.get("retry_count", 0)
@@ -593,21 +845,21 @@ Please proceed with your fix and retry.
                         
                         # Format retry feedback
                         retry_feedback = self._format_retry_feedback(tool_error, original_user_input)
-                        user_input = retry_feedback
                         
-                        # Add retry feedback as message for context
-                        self.current_state["messages"].append(HumanMessage(content=retry_feedback))
+                        # Transient input for the next attempt, not persisted history
+                        user_input = retry_feedback
                         
                         # Continue to next iteration of retry loop
                         continue
                 
                 # Calculate latency
-                end_time = datetime.now()
-                latency_seconds = (end_time - start_time).total_seconds()
+                latency_seconds = time.perf_counter() - start_time
                 
                 # After streaming completes, always save AIMessage (even if empty - tool-only responses)
-                retry_count = self.current_state.get("retry_count", 0)
-                self.current_state["messages"].append(AIMessage(
+                state = self.current_state
+                messages = state["messages"]
+                retry_count = state.get("retry_count", 0)
+                messages.append(AIMessage.model_construct(
                     content=response_content or "(tool execution only)",
                     additional_kwargs={
                         "model": self.model.model_name,
@@ -620,13 +872,14 @@ Please proceed with your fix and retry.
                 ))
             
                 # Add tags and metadata for LangSmith filtering
-                self._add_trace_tags_and_metadata(original_user_input, response_content, latency_seconds, success=True, tool_call_count=tool_call_count)
+                self._add_trace_tags_and_metadata(original_user_input, response_content, latency_seconds, success=True, tool_call_count=tool_call_count, usage=usage)
                 
                 # Update state timestamp
-                self.current_state = update_state_timestamp(self.current_state)
+                update_state_timestamp(state)
+                message_count = len(messages)
                 
-                # Save state
-                memory_manager.save_state(self.current_session_id, self.current_state)
+                # Save state in the background so the response isn't held up by disk I/O
+                memory_manager.save_state_background(self.current_session_id, state)
                 
                 # Yield completion event with metadata
                 yield {
@@ -637,8 +890,8 @@ Please proceed with your fix and retry.
                         "timestamp": datetime.now().isoformat(),
                         "metadata": {
                             "latency_seconds": latency_seconds,
-                            "turn_number": len(self.current_state["messages"]) // 2,
-                            "session_message_count": len(self.current_state["messages"]),
+                            "turn_number": message_count // 2,
+                            "session_message_count": message_count,
                             "tool_call_count": tool_call_count,
                             "retry_count": retry_count
                         }
@@ -679,17 +932,15 @@ Please proceed with your fix and retry.
                     
                     # Format retry feedback
                     retry_feedback = self._format_retry_feedback(error_info, original_user_input)
-                    user_input = retry_feedback
                     
-                    # Add retry feedback as message
-                    self.current_state["messages"].append(HumanMessage(content=retry_feedback))
+                    # Transient input for the next attempt, not persisted history
+                    user_input = retry_feedback
                     
                     # Continue to next iteration
                     continue
                 else:
                     # No more retries - yield error
-                    end_time = datetime.now()
-                    latency_seconds = (end_time - start_time).total_seconds()
+                    latency_seconds = time.perf_counter() - start_time
                     
                     # Add tags for error tracking
                     self._add_trace_tags_and_metadata(original_user_input, str(e), latency_seconds, success=False, error_type=type(e).__name__, tool_call_count=0)
@@ -726,20 +977,12 @@ Please proceed with your fix and retry.
         if not self.current_state:
             return {"error": "No active session"}
         
-        # Handle datetime objects that might be strings after JSON serialization
-        created_at = self.current_state["created_at"]
-        last_updated = self.current_state["last_updated"]
-        
-        # Convert to string if it's a datetime object, otherwise use as-is
-        created_at_str = created_at.isoformat() if hasattr(created_at, 'isoformat') else str(created_at)
-        last_updated_str = last_updated.isoformat() if hasattr(last_updated, 'isoformat') else str(last_updated)
-        
         return {
             "session_id": self.current_session_id,
             "message_count": len(self.current_state["messages"]),
             "files_in_context": len(self.current_state["current_files"]),
-            "created_at": created_at_str,
-            "last_updated": last_updated_str,
+            "created_at": format_timestamp(self.current_state["created_at"]),
+            "last_updated": format_timestamp(self.current_state["last_updated"]),
             "last_error": self.current_state["last_error"]
         }
     
@@ -750,10 +993,17 @@ Please proceed with your fix and retry.
 
 # Global agent instance - will be initialized when needed
 agent = None
+_agent_lock = threading.Lock()
 
 def get_agent(model_name: str = None, temperature: float = None) -> CodingAgent:
-    """Get or create the global agent instance."""
+    """Get or create the global agent instance.
+    
+    Double-checked locking: the common already-built path takes no lock, and
+    threads racing on first use build only one agent.
+    """
     global agent
     if agent is None:
-        agent = CodingAgent(model_name, temperature)
+        with _agent_lock:
+            if agent is None:
+                agent = CodingAgent(model_name, temperature)
     return agent
@@ -4,6 +4,7 @@ Loads settings from environment variables and .env file.
 """
 
 import os
+from functools import lru_cache
 from pathlib import Path
 from dotenv import load_dotenv
 from typing import Optional
@@ -19,33 +20,44 @@ class Config:
         if env_path.exists():
             load_dotenv(env_path)
         
+        # Snapshot the environment once; every setting below is a plain dict lookup
+        env = os.environ.copy()
+        
         # Core settings
-        self.workspace_path = self._get_workspace_path()
-        self.default_model = os.getenv("DEFAULT_MODEL", "gpt-4o-mini")
-        self.model_temperature = float(os.getenv("MODEL_TEMPERATURE", "0.0"))
+        self.workspace_path = self._get_workspace_path(env)
+        self.default_model = env.get("DEFAULT_MODEL", "gpt-4o-mini")
+        self.model_temperature = float(env.get("MODEL_TEMPERATURE", "0.0"))
         
         # Tool settings
-        self.command_timeout = int(os.getenv("COMMAND_TIMEOUT", "30"))
-        self.memory_storage_dir = os.getenv("MEMORY_STORAGE_DIR", ".agent_memory")
+        self.command_timeout = int(env.get("COMMAND_TIMEOUT", "30"))
+        self.memory_storage_dir = env.get("MEMORY_STORAGE_DIR", ".agent_memory")
         
         # Agent settings
-        self.max_history_messages = int(os.getenv("MAX_HISTORY_MESSAGES", "20"))
+        self.max_history_messages = int(env.get("MAX_HISTORY_MESSAGES", "20"))
+        self.max_history_tokens = int(env.get("MAX_HISTORY_TOKENS", "16000"))
+        self.response_cache_size = int(env.get("RESPONSE_CACHE_SIZE", "128"))  # 0 disables
+        self.summarize_history = env.get("SUMMARIZE_HISTORY", "true").lower() == "true"
+        self.summary_model = env.get("SUMMARY_MODEL", "gpt-4o-mini")
+        self.summary_trigger_tokens = int(env.get("SUMMARY_TRIGGER_TOKENS", "1000"))
+        
+        # Include stack traces in web UI error events (and print them server-side)
+        self.debug = env.get("DEBUG", "false").lower() == "true"
         
         # Retry settings
-        self.max_retry = int(os.getenv("MAX_RETRY", "3"))
-        self.auto_retry = os.getenv("AUTO_RETRY", "true").lower() == "true"
+        self.max_retry = int(env.get("MAX_RETRY", "3"))
+        self.auto_retry = env.get("AUTO_RETRY", "true").lower() == "true"
         
         # Git settings
-        self.git_enabled = os.getenv("GIT_ENABLED", "true").lower() == "true"
-        self.git_auto_push = os.getenv("GIT_AUTO_PUSH", "false").lower() == "true"
-        self.git_main_branch = os.getenv("GIT_MAIN_BRANCH", "main")
+        self.git_enabled = env.get("GIT_ENABLED", "true").lower() == "true"
+        self.git_auto_push = env.get("GIT_AUTO_PUSH", "false").lower() == "true"
+        self.git_main_branch = env.get("GIT_MAIN_BRANCH", "main")
         
         # LangSmith settings for tracing and evaluation
         # Note: Use LANGCHAIN_* prefix (official LangSmith env vars)
-        self.langsmith_tracing = os.getenv("LANGCHAIN_TRACING_V2", "false").lower() == "true"
-        self.langsmith_api_key = os.getenv("LANGCHAIN_API_KEY") or os.getenv("LANGSMITH_API_KEY")
-        self.langsmith_project = os.getenv("LANGCHAIN_PROJECT", "coding-agent")
-        self.langsmith_endpoint = os.getenv("LANGCHAIN_ENDPOINT", "https://api.smith.langchain.com")
+        self.langsmith_tracing = env.get("LANGCHAIN_TRACING_V2", "false").lower() == "true"
+        self.langsmith_api_key = env.get("LANGCHAIN_API_KEY") or env.get("LANGSMITH_API_KEY")
+        self.langsmith_project = env.get("LANGCHAIN_PROJECT", "coding-agent")
+        self.langsmith_endpoint = env.get("LANGCHAIN_ENDPOINT", "https://api.smith.langchain.com")
         
         # Set LangSmith environment variables if not already set
         # This ensures LangChain automatically traces all operations
@@ -58,9 +70,9 @@ class Config:
         # Ensure workspace directory exists
         self._ensure_workspace_exists()
     
-    def _get_workspace_path(self) -> Path:
+    def _get_workspace_path(self, env: dict) -> Path:
         """Get the workspace path from environment or use current directory."""
-        workspace = os.getenv("WORKSPACE_PATH")
+        workspace = env.get("WORKSPACE_PATH")
         if workspace:
             return Path(workspace)
         else:
@@ -96,6 +108,30 @@ class Config:
         """Get maximum number of history messages to pass to agent."""
         return self.max_history_messages
     
+    def get_max_history_tokens(self) -> int:
+        """Get token budget for the prompt: system prompt, history and input together."""
+        return self.max_history_tokens
+    
+    def get_response_cache_size(self) -> int:
+        """Get max cached responses for deterministic (temperature 0) turns."""
+        return self.response_cache_size
+    
+    def get_summarize_history(self) -> bool:
+        """Get whether messages evicted from the history window are summarized."""
+        return self.summarize_history
+    
+    def get_summary_model(self) -> str:
+        """Get the model used to summarize evicted history."""
+        return self.summary_model
+    
+    def get_summary_trigger_tokens(self) -> int:
+        """Get evicted-message token count that triggers a summary update."""
+        return self.summary_trigger_tokens
+    
+    def get_debug(self) -> bool:
+        """Check if debug output (stack traces in web UI errors) is enabled."""
+        return self.debug
+    
     def get_max_retry(self) -> int:
         """Get maximum number of retry attempts for failed operations."""
         return self.max_retry
@@ -161,6 +197,10 @@ class Config:
         print(f"  Command Timeout: {self.command_timeout}s")
         print(f"  Memory Storage: {self.memory_storage_dir}")
         print(f"  Max History Messages: {self.max_history_messages}")
+        print(f"  Max History Tokens: {self.max_history_tokens}")
+        print(f"  Response Cache Size: {self.response_cache_size}")
+        print(f"  Summarize History: {self.summarize_history} ({self.summary_model}, every {self.summary_trigger_tokens} tokens)")
+        print(f"  Debug: {self.debug}")
         print(f"  Max Retry Attempts: {self.max_retry}")
         print(f"  Auto Retry Enabled: {self.auto_retry}")
         print(f"  Git Enabled: {self.git_enabled}")
@@ -172,5 +212,11 @@ class Config:
         print(f"  OpenAI API Key: {'Set' if self.get_openai_api_key() else 'Not set'}")
 
 
+@lru_cache(maxsize=1)
+def get_config() -> Config:
+    """Return the process-wide Config, building it (and parsing .env) only once."""
+    return Config()
+
+
 # Global configuration instance
-config = Config()
+config = get_config()
@@ -4,20 +4,91 @@ Enables the agent to create branches, commit changes, and push to remote.
 """
 
 import os
+import threading
+from functools import lru_cache, wraps
 from pathlib import Path
-from typing import Optional, List, Dict, Any
-from git import Repo, GitCommandError
-from git.exc import InvalidGitRepositoryError
+from typing import TYPE_CHECKING, Optional, List, Dict, Any
 from langchain_core.tools import tool
 from .config import config
 
+if TYPE_CHECKING:
+    from git import Repo
 
-def _get_repo() -> Repo:
-    """Get the Git repository object for the main project."""
+# GitPython is imported on the first git tool call (see _load_git) so sessions
+# that never touch git don't pay for its import
+GitCommandError = None
+InvalidGitRepositoryError = None
+
+
+def _load_git():
+    """Import GitPython and bind its exception types at module level."""
+    global GitCommandError, InvalidGitRepositoryError
+    if GitCommandError is None:
+        from git import GitCommandError
+        from git.exc import InvalidGitRepositoryError
+
+
+# The cached Repo is shared by every git tool, and GitPython reads objects through
+# one persistent `git cat-file` process per Repo, which can't serve two threads at
+# once. Parallel tool calls run in worker threads, so git tools take turns.
+_repo_lock = threading.Lock()
+
+
+def _serialized(func):
+    """Run a git tool while holding the shared repository lock."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with _repo_lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _git_dir_identity(git_dir: str) -> Optional[tuple]:
+    """Identify a repository's .git directory, or None if it no longer exists.
+    
+    Inodes are reused straight away, so a re-created .git can come back with the
+    same one; the config file `git init` writes carries a fresh ctime.
+    """
+    try:
+        st = os.stat(os.path.join(git_dir, "config"))
+    except OSError:
+        return None
+    return st.st_ino, st.st_ctime_ns
+
+
+@lru_cache(maxsize=4)
+def _get_repo_cached(repo_path: str) -> tuple:
+    """Open a repository once per process; Repo reads HEAD and refs live, so reuse is safe.
+    
+    Returns the Repo with the identity of its .git directory, so a repository
+    deleted or re-created since it was opened can be detected.
+    """
+    from git import Repo
+    repo = Repo(repo_path)
+    return repo, _git_dir_identity(repo.git_dir)
+
+
+def _invalidate_repo_cache():
+    """Drop cached Repo objects, e.g. if the repo is re-created."""
+    _get_repo_cached.cache_clear()
+
+
+def _get_repo() -> "Repo":
+    """Get the Git repository object for the main project.
+    
+    Every git tool calls this before anything else, so GitPython's exception
+    types are bound by the time their except clauses can run.
+    """
+    _load_git()
     try:
         # Get the project root (parent of workspace)
         repo_path = config.get_workspace_path().parent
-        repo = Repo(repo_path)
+        repo, git_dir_identity = _get_repo_cached(str(repo_path))
+        if _git_dir_identity(repo.git_dir) != git_dir_identity:
+            # .git was deleted or re-created; the cached Repo's cat-file processes are stale
+            repo.close()
+            _invalidate_repo_cache()
+            repo, _ = _get_repo_cached(str(repo_path))
         return repo
     except InvalidGitRepositoryError:
         raise RuntimeError(
@@ -26,18 +97,59 @@ def _get_repo() -> Repo:
         )
 
 
+# git_diff stops reading after whichever limit is hit first
+MAX_DIFF_LINES = 500
+MAX_DIFF_BYTES = 256 * 1024
+
+# Branches git_push warns about and never force-pushes; GIT_MAIN_BRANCH is added on first use
+_PROTECTED_BRANCHES = frozenset({"main", "master", "develop"})
+
+
+def _read_diff(repo: "Repo", *args: str) -> str:
+    """Stream `git diff` output, stopping early once it exceeds the line or byte cap.
+    
+    Large changesets are never materialized in full; the subprocess is
+    terminated as soon as the cap is reached and a truncation notice appended.
+    """
+    proc = repo.git.diff(*args, as_process=True)
+    chunks, size, truncated = [], 0, False
+    for line in proc.stdout:
+        if len(chunks) >= MAX_DIFF_LINES or size + len(line) > MAX_DIFF_BYTES:
+            truncated = True
+            break
+        chunks.append(line)
+        size += len(line)
+    
+    if truncated:
+        proc.terminate()
+        proc.proc.wait()
+    else:
+        proc.wait()  # Raises GitCommandError on failure, like repo.git.diff()
+    
+    diff = b"".join(chunks).decode("utf-8", errors="replace").rstrip("\n")
+    if truncated:
+        diff += f"\n\n... diff truncated after {len(chunks)} lines ({size // 1024} KB)"
+    return diff
+
+
 def _format_commit(commit) -> str:
     """Format a commit object for display."""
     return f"{commit.hexsha[:7]} - {commit.author.name}: {commit.message.strip()}"
 
 
+@lru_cache(maxsize=1)
+def _protected_branches() -> frozenset:
+    """Default protected branches plus the configured main branch, resolved once."""
+    return _PROTECTED_BRANCHES | {config.get_git_main_branch()}
+
+
 def _is_protected_branch(branch_name: str) -> bool:
-    """Check if a branch is protected (main, master, develop)."""
-    protected = ["main", "master", "develop"]
-    return branch_name in protected
+    """Check if a branch is protected (main, master, develop, or GIT_MAIN_BRANCH)."""
+    return branch_name in _protected_branches()
 
 
 @tool
+@_serialized
 def git_status() -> str:
     """Check the current git status of the workspace.
     
@@ -54,31 +166,32 @@ def git_status() -> str:
     
     status_lines = [f"📍 Current branch: {repo.active_branch.name}"]
     
-    # Check for uncommitted changes
-    if repo.is_dirty(untracked_files=True):
-        # Modified files
-        modified = [item.a_path for item in repo.index.diff(None)]
-        if modified:
-            status_lines.append(f"\n📝 Modified files ({len(modified)}):")
-            status_lines.extend([f"  - {f}" for f in modified[:10]])
-            if len(modified) > 10:
-                status_lines.append(f"  ... and {len(modified) - 10} more")
-        
-        # Staged files
-        staged = [item.a_path for item in repo.index.diff("HEAD")]
-        if staged:
-            status_lines.append(f"\n✅ Staged files ({len(staged)}):")
-            status_lines.extend([f"  - {f}" for f in staged[:10]])
-            if len(staged) > 10:
-                status_lines.append(f"  ... and {len(staged) - 10} more")
-        
-        # Untracked files
-        untracked = repo.untracked_files
-        if untracked:
-            status_lines.append(f"\n❓ Untracked files ({len(untracked)}):")
-            status_lines.extend([f"  - {f}" for f in untracked[:10]])
-            if len(untracked) > 10:
-                status_lines.append(f"  ... and {len(untracked) - 10} more")
+    # One porcelain status call reads the index once; each entry is "XY path",
+    # X = staged state, Y = working tree state. Renames/copies carry an extra
+    # source path entry, which is skipped.
+    modified, staged, untracked = [], [], []
+    entries = iter(repo.git.status(porcelain="v1", z=True, untracked_files="all").split("\0"))
+    for entry in entries:
+        if not entry:
+            continue
+        code, path = entry[:2], entry[3:]
+        if code == "??":
+            untracked.append(path)
+            continue
+        if code[0] not in " !":
+            staged.append(path)
+        if code[1] not in " !":
+            modified.append(path)
+        if code[0] in "RC":
+            next(entries, None)
+    
+    if modified or staged or untracked:
+        for icon, label, files in (("📝", "Modified", modified), ("✅", "Staged", staged), ("❓", "Untracked", untracked)):
+            if files:
+                status_lines.append(f"\n{icon} {label} files ({len(files)}):")
+                status_lines.extend([f"  - {f}" for f in files[:10]])
+                if len(files) > 10:
+                    status_lines.append(f"  ... and {len(files) - 10} more")
     else:
         status_lines.append("\n✨ Working tree clean - no changes to commit")
     
@@ -86,6 +199,7 @@ def git_status() -> str:
 
 
 @tool
+@_serialized
 def git_create_branch(feature_name: str) -> str:
     """Create a new branch following the agent/feature naming convention.
     
@@ -104,7 +218,7 @@ def git_create_branch(feature_name: str) -> str:
     branch_name = f"agent/{feature_name}"
     
     # Check if branch already exists
-    if branch_name in [b.name for b in repo.branches]:
+    if branch_name in {head.name for head in repo.heads}:
         return f"⚠️  Branch '{branch_name}' already exists. Use git_checkout_branch to switch to it."
     
     try:
@@ -118,6 +232,7 @@ def git_create_branch(feature_name: str) -> str:
 
 
 @tool
+@_serialized
 def git_checkout_branch(branch_name: str) -> str:
     """Switch to an existing branch.
     
@@ -130,10 +245,10 @@ def git_checkout_branch(branch_name: str) -> str:
     repo = _get_repo()
     
     try:
-        # Check if branch exists
-        if branch_name not in [b.name for b in repo.branches]:
-            available = [b.name for b in repo.branches]
-            return f"❌ Branch '{branch_name}' not found. Available branches: {', '.join(available)}"
+        # Check if branch exists (one ref listing, reused for the error message)
+        branch_names = {head.name for head in repo.heads}
+        if branch_name not in branch_names:
+            return f"❌ Branch '{branch_name}' not found. Available branches: {', '.join(sorted(branch_names))}"
         
         # Checkout the branch
         repo.git.checkout(branch_name)
@@ -144,6 +259,7 @@ def git_checkout_branch(branch_name: str) -> str:
 
 
 @tool
+@_serialized
 def git_list_branches() -> str:
     """List all local branches.
     
@@ -157,14 +273,15 @@ def git_list_branches() -> str:
     current = repo.active_branch.name
     branches = []
     
-    for branch in repo.branches:
-        prefix = "* " if branch.name == current else "  "
-        branches.append(f"{prefix}{branch.name}")
+    for name in (head.name for head in repo.heads):
+        prefix = "* " if name == current else "  "
+        branches.append(f"{prefix}{name}")
     
     return "📋 Local branches:\n" + "\n".join(branches)
 
 
 @tool
+@_serialized
 def git_diff(file_path: Optional[str] = None) -> str:
     """Show changes in the working directory.
     
@@ -179,12 +296,12 @@ def git_diff(file_path: Optional[str] = None) -> str:
     try:
         if file_path:
             # Show diff for specific file
-            diff = repo.git.diff(file_path)
+            diff = _read_diff(repo, file_path)
             if not diff:
                 return f"No changes in {file_path}"
         else:
             # Show all changes
-            diff = repo.git.diff()
+            diff = _read_diff(repo)
             if not diff:
                 return "No changes in working directory"
         
@@ -194,6 +311,7 @@ def git_diff(file_path: Optional[str] = None) -> str:
 
 
 @tool
+@_serialized
 def git_stage_files(file_patterns: List[str] = None) -> str:
     """Stage files for commit.
     
@@ -210,20 +328,21 @@ def git_stage_files(file_patterns: List[str] = None) -> str:
         if not file_patterns:
             # Stage all changes
             repo.git.add(A=True)
-            staged_count = len([item.a_path for item in repo.index.diff("HEAD")])
-            return f"✅ Staged all changes ({staged_count} files)"
         else:
-            # Stage specific patterns
-            for pattern in file_patterns:
-                repo.git.add(pattern)
-            
-            staged = [item.a_path for item in repo.index.diff("HEAD")]
-            return f"✅ Staged {len(staged)} files:\n" + "\n".join([f"  - {f}" for f in staged[:10]])
+            # Stage all patterns in one git call; `--` keeps names starting with `-` from being read as options
+            repo.git.add('--', *file_patterns)
+        
+        # Native name-only diff of the index; no per-file diff objects or blob reads
+        staged = repo.git.diff('--cached', '--name-only').splitlines()
+        if not file_patterns:
+            return f"✅ Staged all changes ({len(staged)} files)"
+        return f"✅ Staged {len(staged)} files:\n" + "\n".join(f"  - {f}" for f in staged[:10])
     except GitCommandError as e:
         raise RuntimeError(f"Failed to stage files: {e}")
 
 
 @tool
+@_serialized
 def git_commit(message: str) -> str:
     """Commit staged changes with a message.
     
@@ -251,6 +370,7 @@ def git_commit(message: str) -> str:
 
 
 @tool
+@_serialized
 def git_push(branch_name: Optional[str] = None, force: bool = False) -> str:
     """Push commits to remote repository.
     
@@ -303,6 +423,7 @@ def git_push(branch_name: Optional[str] = None, force: bool = False) -> str:
 
 
 @tool
+@_serialized
 def git_pull(branch_name: Optional[str] = None) -> str:
     """Pull latest changes from remote repository.
     
@@ -334,6 +455,7 @@ def git_pull(branch_name: Optional[str] = None) -> str:
 
 
 @tool
+@_serialized
 def git_log(limit: int = 10, branch_name: Optional[str] = None) -> str:
     """Show recent commit history.
     
@@ -347,25 +469,21 @@ def git_log(limit: int = 10, branch_name: Optional[str] = None) -> str:
     repo = _get_repo()
     
     try:
-        if branch_name:
-            commits = list(repo.iter_commits(branch_name, max_count=limit))
-        else:
-            commits = list(repo.iter_commits(max_count=limit))
+        # One native call with preformatted lines instead of lazily parsed Commit objects
+        raw = repo.git.log(f"-n{limit}", "--pretty=format:%h - %an: %s", *([branch_name] if branch_name else []))
+        commits = raw.splitlines()
         
         if not commits:
             return "No commits yet"
         
-        log_lines = [f"📜 Recent commits ({len(commits)}):"]
-        for commit in commits:
-            log_lines.append(f"  {_format_commit(commit)}")
-        
-        return "\n".join(log_lines)
+        return f"📜 Recent commits ({len(commits)}):\n  " + "\n  ".join(commits)
     
     except GitCommandError as e:
         raise RuntimeError(f"Failed to get log: {e}")
 
 
 @tool
+@_serialized
 def git_show_commit(commit_hash: str) -> str:
     """Show details of a specific commit.
     
@@ -398,6 +516,7 @@ def git_show_commit(commit_hash: str) -> str:
 
 
 @tool
+@_serialized
 def git_branch_summary() -> str:
     """Get a summary of the current branch and its status relative to remote.
     
@@ -425,12 +544,9 @@ def git_branch_summary() -> str:
         try:
             tracking_branch = current_branch.tracking_branch()
             if tracking_branch:
-                # Compare with remote
-                ahead = repo.iter_commits(f'{tracking_branch.name}..{branch_name}')
-                behind = repo.iter_commits(f'{branch_name}..{tracking_branch.name}')
-                
-                ahead_count = sum(1 for _ in ahead)
-                behind_count = sum(1 for _ in behind)
+                # Compare with remote; git counts natively instead of building Commit objects
+                ahead_count = int(repo.git.rev_list('--count', f'{tracking_branch.name}..{branch_name}'))
+                behind_count = int(repo.git.rev_list('--count', f'{branch_name}..{tracking_branch.name}'))
                 
                 if ahead_count > 0:
                     summary.append(f"⬆️  Ahead of {tracking_branch.name} by {ahead_count} commit(s)")
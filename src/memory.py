@@ -1,121 +1,643 @@
 """
 Simple memory management for conversation persistence.
-Using InMemorySaver initially, can be upgraded to Redis later.
+Sessions are stored as compressed snapshots plus an append log on disk.
 """
 
+import atexit
 import json
 import os
+import struct
+import threading
+import time
+import msgspec
+import orjson
+import zstandard
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Dict, Any, Optional, List
 from datetime import datetime
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
-from .state import AgentState
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, BaseMessage
+from .state import AgentState, format_timestamp
 from .config import config
 
 
+# Appended log records between full snapshots (which also compact the log)
+SNAPSHOT_INTERVAL = 10
+
+# How long list_sessions reuses its directory scan, for UIs that poll it
+SESSION_LIST_TTL = 1.0
+
+# Append-log descriptors kept open across turns; the least recently opened is closed past this
+MAX_OPEN_LOGS = 64
+
+
+# The on-disk structs never take part in reference cycles, so gc=False keeps
+# them out of the cyclic GC; a long session decodes thousands of messages
+class SerializedMsg(msgspec.Struct, gc=False):
+    """On-disk form of a message; a slotted struct, so no per-message dict is built on save."""
+    
+    type: str = "HumanMessage"
+    content: Any = ""
+    additional_kwargs: Dict[str, Any] = {}
+    response_metadata: Dict[str, Any] = {}
+
+
+class SerializedState(msgspec.Struct, gc=False):
+    """On-disk form of an AgentState snapshot, decoded field-by-field without building dicts."""
+    
+    messages: List[SerializedMsg] = []
+    current_files: Dict[str, Any] = {}
+    last_command_output: Optional[str] = None
+    last_error: Optional[Dict[str, Any]] = None
+    retry_count: int = 0
+    retry_history: List[Dict[str, Any]] = []
+    summary: Optional[str] = None
+    summary_upto: int = 0
+    session_id: Optional[str] = None
+    created_at: Optional[str] = None
+    last_updated: Optional[str] = None
+
+
+class LogRecord(msgspec.Struct, gc=False):
+    """One append-log frame: messages from index `start` onward plus the other state fields."""
+    
+    start: int
+    messages: List[SerializedMsg]
+    state: Dict[str, Any]
+
+
+# Stored message type name -> class; unknown types load as HumanMessage
+_MSG_TYPES = {
+    "AIMessage": AIMessage,
+    "HumanMessage": HumanMessage,
+    "SystemMessage": SystemMessage,
+}
+
+_ENC = msgspec.msgpack.Encoder()
+_DEC = msgspec.msgpack.Decoder(SerializedState)
+_LOG_DEC = msgspec.msgpack.Decoder(LogRecord)
+
+# Each append-log frame is a 4-byte big-endian length followed by a msgpack LogRecord
+_FRAME_HEADER = struct.Struct(">I")
+
+# zstd contexts are costly to set up but not safe to share between threads, so
+# each thread (the save writer, callers of load_state) keeps its own pair
+_zstd_contexts = threading.local()
+
+
+def _compress(data: bytes) -> bytes:
+    """zstd-compress a snapshot with this thread's reusable compressor."""
+    compressor = getattr(_zstd_contexts, "compressor", None)
+    if compressor is None:
+        # Chat transcripts are repetitive prose; level 3 shrinks them several-fold cheaply
+        compressor = _zstd_contexts.compressor = zstandard.ZstdCompressor(level=3)
+    return compressor.compress(data)
+
+
+def _decompress(data: bytes) -> bytes:
+    """Decompress a snapshot with this thread's reusable decompressor."""
+    decompressor = getattr(_zstd_contexts, "decompressor", None)
+    if decompressor is None:
+        decompressor = _zstd_contexts.decompressor = zstandard.ZstdDecompressor()
+    return decompressor.decompress(data)
+
+
+def _write_atomic(path: str, data: bytes):
+    """Write `data` to a temp file, fsync it, then swap it into place.
+    
+    A crash mid-write leaves the previous file intact instead of a truncated one,
+    and a failed write (e.g. disk full) doesn't leave its temp file behind.
+    """
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_all(fd: int, data: bytes):
+    """Write all of `data` to `fd`, continuing after short writes.
+    
+    os.write may write only part of a buffer; stopping there would leave a torn
+    frame in the middle of the log. If a write fails partway the caller's save
+    fails, and the next save is a full snapshot that replaces the log.
+    """
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def _loads(raw: bytes) -> Any:
+    """Parse JSON with orjson, falling back to the stdlib for legacy files it rejects (e.g. NaN)."""
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return json.loads(raw)
+
+def _parse_timestamp(value: Any) -> Any:
+    """Turn a stored timestamp back into integer nanoseconds; values that don't parse are returned as-is."""
+    if isinstance(value, str):
+        try:
+            return round(datetime.fromisoformat(value).timestamp() * 1_000_000) * 1000
+        except ValueError:
+            return value
+    return value
+
+SUMMARY_PROMPT = (
+    "Condense the conversation below into a short summary for a coding assistant. "
+    "Keep file names, decisions, errors and anything still unresolved; drop pleasantries "
+    "and raw tool output. If a previous summary is given, fold the new messages into it."
+)
+
+def load_encoder(model_name: Optional[str] = None):
+    """Return a tiktoken encoder for the model, or None if tiktoken can't load one.
+    
+    tiktoken fetches its encoding files on first use, so offline installs get
+    None and token counts fall back to an estimate instead of failing the turn.
+    """
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, encoder=None) -> int:
+    """Count tokens with the given encoder, estimating ~4 characters per token without one."""
+    if encoder is None:
+        return len(text) // 4 + 1
+    # Special-token text such as "<|endoftext|>" is ordinary content in a chat message
+    return len(encoder.encode_ordinary(text))
+
+
 class SimpleMemoryManager:
     """Simple memory manager for agent state persistence."""
     
     def __init__(self, storage_dir: str = None):
         self.storage_dir = storage_dir or config.get_memory_storage_dir()
-        self.memory_saver = MemorySaver()
+        
+        # Single background writer keeps saves off the response path and in order
+        self._save_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-save")
+        self._pending_save: Optional[Future] = None
+        
+        # Saves queued but not yet finished, and sessions whose logs have unsynced
+        # appends; the writer fsyncs those logs together once its queue drains
+        self._queued_saves = 0
+        self._queue_lock = threading.Lock()
+        self._unsynced_logs: set = set()
+        
+        # Messages already on disk and log appends since the last snapshot, per session
+        self._persisted_counts: Dict[str, int] = {}
+        self._append_counts: Dict[str, int] = {}
+        
+        # Cheap model for summarizing evicted history, and its encoder, created on first use
+        self._summary_model = None
+        self._summary_encoder = None
+        
+        # Non-message fields as last written per session; log records carry only what changed
+        self._last_fields: Dict[str, Dict[str, Any]] = {}
+        
+        # Open O_APPEND descriptors for session logs, so appends skip open/close each turn
+        self._log_fds: Dict[str, int] = {}
+        
+        # (scan time, session ids); reset whenever a snapshot is written or a session deleted
+        self._sessions_cache: Optional[tuple] = None
         
         # Create storage directory if it doesn't exist
         os.makedirs(self.storage_dir, exist_ok=True)
     
-    def _serialize_message(self, msg: BaseMessage) -> Dict[str, Any]:
-        """Serialize a message object to JSON-compatible dict."""
+    def _serialize_message(self, msg: BaseMessage) -> SerializedMsg:
+        """Serialize a message object to its on-disk struct."""
+        return SerializedMsg(
+            msg.__class__.__name__,
+            msg.content,
+            msg.additional_kwargs,
+            getattr(msg, 'response_metadata', {})
+        )
+    
+    def _deserialize_message(self, msg: SerializedMsg) -> BaseMessage:
+        """Deserialize a stored message back to message object."""
+        # Stored messages were validated when created, so skip re-validation
+        return _MSG_TYPES.get(msg.type, HumanMessage).model_construct(
+            content=msg.content,
+            additional_kwargs=msg.additional_kwargs,
+            response_metadata=msg.response_metadata
+        )
+    
+    def _serialize_fields(self, state: AgentState) -> Dict[str, Any]:
+        """Serialize every state field except the message list."""
         return {
-            "type": msg.__class__.__name__,
-            "content": msg.content,
-            "additional_kwargs": msg.additional_kwargs,
-            "response_metadata": getattr(msg, 'response_metadata', {})
+            "current_files": state.get("current_files", {}),
+            "last_command_output": state.get("last_command_output"),
+            "last_error": state.get("last_error"),
+            "retry_count": state.get("retry_count", 0),
+            "retry_history": state.get("retry_history", []),
+            "summary": state.get("summary"),
+            "summary_upto": state.get("summary_upto", 0),
+            "session_id": state.get("session_id"),
+            "created_at": format_timestamp(state.get("created_at")),
+            "last_updated": format_timestamp(state.get("last_updated"))
         }
     
-    def _deserialize_message(self, msg_dict: Dict[str, Any]) -> BaseMessage:
-        """Deserialize a message dict back to message object."""
-        msg_type = msg_dict.get("type", "HumanMessage")
-        content = msg_dict.get("content", "")
-        
-        if msg_type == "AIMessage":
-            return AIMessage(content=content)
-        else:
-            return HumanMessage(content=content)
+    def _remember_fields(self, session_id: str, fields: Dict[str, Any]):
+        """Record the fields just written, copying the containers the caller may keep mutating."""
+        self._last_fields[session_id] = {
+            **fields,
+            "current_files": dict(fields["current_files"]),
+            "retry_history": list(fields["retry_history"])
+        }
+    
+    def _snapshot_path(self, session_id: str) -> str:
+        return os.path.join(self.storage_dir, f"{session_id}.msgpack.zst")
+    
+    def _legacy_snapshot_paths(self, session_id: str) -> tuple:
+        """Uncompressed msgpack and JSON snapshots written by earlier versions."""
+        return (
+            os.path.join(self.storage_dir, f"{session_id}.msgpack"),
+            os.path.join(self.storage_dir, f"{session_id}.json")
+        )
+    
+    def _log_path(self, session_id: str) -> str:
+        return os.path.join(self.storage_dir, f"{session_id}.log")
+    
+    def _legacy_log_path(self, session_id: str) -> str:
+        return os.path.join(self.storage_dir, f"{session_id}.jsonl")
+    
+    def _log_fd(self, session_id: str) -> int:
+        """Return the session's open append-log descriptor, opening it on first use."""
+        fd = self._log_fds.get(session_id)
+        if fd is None:
+            if len(self._log_fds) >= MAX_OPEN_LOGS:
+                self._close_log(next(iter(self._log_fds)))
+            fd = os.open(self._log_path(session_id), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._log_fds[session_id] = fd
+        return fd
+    
+    def _close_log(self, session_id: str):
+        """Close the session's append-log descriptor, if one is open, syncing unsynced appends first."""
+        fd = self._log_fds.pop(session_id, None)
+        if fd is not None:
+            if session_id in self._unsynced_logs:
+                self._unsynced_logs.discard(session_id)
+                os.fsync(fd)
+            os.close(fd)
+    
+    def _sync_logs(self):
+        """fsync every log appended to since the last sync: one fsync per session per batch."""
+        for session_id in self._unsynced_logs:
+            fd = self._log_fds.get(session_id)
+            if fd is not None:
+                os.fsync(fd)
+        self._unsynced_logs.clear()
+    
+    def _run_save(self, save, *args) -> bool:
+        """Run a queued save on the writer thread, syncing logs if it was the last one queued."""
+        try:
+            return save(*args)
+        finally:
+            with self._queue_lock:
+                self._queued_saves -= 1
+                drained = self._queued_saves == 0
+            if drained:
+                try:
+                    self._sync_logs()
+                except OSError as e:
+                    print(f"Error syncing session logs: {e}")
+    
+    def _submit_save(self, save, *args) -> Future:
+        """Queue `save(*args)` on the background writer."""
+        with self._queue_lock:
+            self._queued_saves += 1
+        self._pending_save = self._save_executor.submit(self._run_save, save, *args)
+        return self._pending_save
     
     def save_state(self, session_id: str, state: AgentState) -> bool:
-        """Save agent state to memory."""
+        """Save a full snapshot of the agent state and compact away its append log."""
         try:
             # Serialize messages properly
+            fields = self._serialize_fields(state)
             serialized_state = {
                 "messages": [self._serialize_message(msg) for msg in state.get("messages", [])],
-                "current_files": state.get("current_files", {}),
-                "last_command_output": state.get("last_command_output"),
-                "last_error": state.get("last_error"),
-                "retry_count": state.get("retry_count", 0),
-                "retry_history": state.get("retry_history", []),
-                "session_id": state.get("session_id"),
-                "created_at": str(state.get("created_at")),
-                "last_updated": str(state.get("last_updated"))
+                **fields
             }
             
-            # Save to local file
-            file_path = os.path.join(self.storage_dir, f"{session_id}.json")
-            with open(file_path, 'w') as f:
-                json.dump(serialized_state, f, indent=2)
+            # Save to local file; the fields only count as written once it succeeds
+            _write_atomic(self._snapshot_path(session_id), _compress(_ENC.encode(serialized_state)))
+            self._remember_fields(session_id, fields)
+            self._sessions_cache = None
+            
+            # Everything in the logs and any legacy snapshot is now part of the snapshot
+            self._unsynced_logs.discard(session_id)
+            self._close_log(session_id)
+            stale_paths = (
+                self._log_path(session_id),
+                self._legacy_log_path(session_id),
+                *self._legacy_snapshot_paths(session_id)
+            )
+            for stale_path in stale_paths:
+                if os.path.exists(stale_path):
+                    os.remove(stale_path)
             
             return True
         except Exception as e:
             print(f"Error saving state: {e}")
             return False
     
+    def append_messages(self, session_id: str, start: int, new_messages: List[BaseMessage], state: AgentState) -> bool:
+        """Append messages from index `start` onward, plus the other state fields, to the session log.
+        
+        Costs O(new messages) instead of rewriting the whole history. Records
+        carry their start index so replaying them over a snapshot is idempotent,
+        and only the fields that changed since the last write, so unchanged
+        file context and retry history aren't re-encoded every turn.
+        """
+        try:
+            fields = self._serialize_fields(state)
+            last = self._last_fields.get(session_id)
+            changed = fields if last is None else {k: v for k, v in fields.items() if last.get(k) != v}
+            record = LogRecord(
+                start,
+                [self._serialize_message(msg) for msg in new_messages],
+                changed
+            )
+            frame = _ENC.encode(record)
+            _write_all(self._log_fd(session_id), _FRAME_HEADER.pack(len(frame)) + frame)
+            self._unsynced_logs.add(session_id)
+            self._remember_fields(session_id, fields)
+            return True
+        except Exception as e:
+            print(f"Error appending state: {e}")
+            return False
+    
+    def _save_turn(self, session_id: str, state: AgentState) -> bool:
+        """Persist a turn on the writer thread: a log append when possible, else a snapshot.
+        
+        The persisted/append counters only advance once the write succeeds. After
+        a failure they are dropped, so the next turn writes a full snapshot instead
+        of appending after a record that never reached the disk (or only partly did).
+        """
+        messages = state["messages"]
+        persisted = self._persisted_counts.get(session_id)
+        appends = self._append_counts.get(session_id, 0)
+        
+        if persisted is None or persisted > len(messages) or appends >= SNAPSHOT_INTERVAL:
+            saved = self.save_state(session_id, state)
+            appends = 0
+        else:
+            saved = self.append_messages(session_id, persisted, messages[persisted:], state)
+            appends += 1
+        
+        if saved:
+            self._persisted_counts[session_id] = len(messages)
+            self._append_counts[session_id] = appends
+        else:
+            self._persisted_counts.pop(session_id, None)
+            self._append_counts.pop(session_id, None)
+        return saved
+    
+    def save_state_background(self, session_id: str, state: AgentState) -> Future:
+        """Queue a save on the background writer and return immediately.
+        
+        Only messages added since the last save are appended to the session
+        log; a full snapshot is written for new sessions, every
+        SNAPSHOT_INTERVAL appends, and after a failed save. The state is copied
+        first so later appends by the caller don't race with serialization. Log
+        appends are fsynced in one batch whenever the writer's queue empties.
+        """
+        fields = {
+            **state,
+            "messages": list(state.get("messages", [])),
+            "current_files": dict(state.get("current_files", {})),
+            "retry_history": list(state.get("retry_history", [])),
+        }
+        return self._submit_save(self._save_turn, session_id, fields)
+    
+    def flush(self):
+        """Block until all queued background saves have been written and synced."""
+        # The writer is single-threaded and FIFO, so the last save finishing means all have
+        pending = self._pending_save
+        if pending is not None:
+            pending.result()
+    
+    def close(self):
+        """Finish queued saves and close any open session-log descriptors."""
+        self.flush()
+        for session_id in list(self._log_fds):
+            self._close_log(session_id)
+    
+    def _read_log(self, session_id: str) -> List[LogRecord]:
+        """Read a session's append-log records in order, oldest first.
+        
+        Records from a legacy JSON-lines log come first. A torn frame at the
+        end of the log (crash mid-append) is cut off so later appends start
+        on a frame boundary.
+        """
+        records = []
+        
+        legacy_log_path = self._legacy_log_path(session_id)
+        if os.path.exists(legacy_log_path):
+            with open(legacy_log_path, 'rb') as f:
+                for line in f:
+                    if line.strip() and line.endswith(b"\n"):
+                        records.append(msgspec.convert(_loads(line), LogRecord))
+        
+        log_path = self._log_path(session_id)
+        if os.path.exists(log_path):
+            with open(log_path, 'rb') as f:
+                data = memoryview(f.read())
+            offset = 0
+            header_size = _FRAME_HEADER.size
+            while offset + header_size <= len(data):
+                (frame_size,) = _FRAME_HEADER.unpack_from(data, offset)
+                end = offset + header_size + frame_size
+                if end > len(data):
+                    break
+                records.append(_LOG_DEC.decode(data[offset + header_size:end]))
+                offset = end
+            if offset < len(data):
+                os.truncate(log_path, offset)
+        
+        return records
+    
     def load_state(self, session_id: str) -> Optional[AgentState]:
-        """Load agent state from memory."""
+        """Load agent state from its snapshot and replay any appended log records."""
+        self.flush()
         try:
-            file_path = os.path.join(self.storage_dir, f"{session_id}.json")
-            if os.path.exists(file_path):
-                with open(file_path, 'r') as f:
-                    data = json.load(f)
-                
-                # Deserialize messages back to proper objects
-                messages = []
-                for msg_data in data.get("messages", []):
-                    if isinstance(msg_data, dict):
-                        messages.append(self._deserialize_message(msg_data))
-                    # Skip old string-format messages
-                
-                # Reconstruct state with proper message objects
-                return {
-                    "messages": messages,
-                    "current_files": data.get("current_files", {}),
-                    "last_command_output": data.get("last_command_output"),
-                    "last_error": data.get("last_error"),
-                    "retry_count": data.get("retry_count", 0),
-                    "retry_history": data.get("retry_history", []),
-                    "session_id": data.get("session_id"),
-                    "created_at": data.get("created_at"),
-                    "last_updated": data.get("last_updated")
-                }
-            return None
+            snapshot_path = self._snapshot_path(session_id)
+            msgpack_path, legacy_path = self._legacy_snapshot_paths(session_id)
+            has_log = os.path.exists(self._log_path(session_id)) or os.path.exists(self._legacy_log_path(session_id))
+            
+            snapshot = None
+            if os.path.exists(snapshot_path):
+                with open(snapshot_path, 'rb') as f:
+                    snapshot = _DEC.decode(_decompress(f.read()))
+            elif os.path.exists(msgpack_path):
+                with open(msgpack_path, 'rb') as f:
+                    snapshot = _DEC.decode(f.read())
+            elif os.path.exists(legacy_path):
+                with open(legacy_path, 'rb') as f:
+                    legacy = _loads(f.read())
+                # Skip old string-format messages
+                legacy["messages"] = [m for m in legacy.get("messages", []) if isinstance(m, dict)]
+                snapshot = msgspec.convert(legacy, SerializedState)
+            elif not has_log:
+                return None
+            
+            # Deserialize messages back to proper objects
+            messages = []
+            data = {}
+            if snapshot is not None:
+                messages = [self._deserialize_message(m) for m in snapshot.messages]
+                data = msgspec.structs.asdict(snapshot)
+            
+            # Replay appended records on top of the snapshot
+            appends = 0
+            if has_log:
+                for record in self._read_log(session_id):
+                    messages[record.start:] = [self._deserialize_message(m) for m in record.messages]
+                    data.update(record.state)
+                    appends += 1
+            
+            self._persisted_counts[session_id] = len(messages)
+            self._append_counts[session_id] = appends
+            
+            # Reconstruct state with proper message objects
+            return {
+                "messages": messages,
+                "current_files": data.get("current_files", {}),
+                "last_command_output": data.get("last_command_output"),
+                "last_error": data.get("last_error"),
+                "retry_count": data.get("retry_count", 0),
+                "retry_history": data.get("retry_history", []),
+                "summary": data.get("summary"),
+                "summary_upto": data.get("summary_upto", 0),
+                "session_id": data.get("session_id"),
+                "created_at": _parse_timestamp(data.get("created_at")),
+                "last_updated": _parse_timestamp(data.get("last_updated"))
+            }
         except Exception as e:
             print(f"Error loading state: {e}")
             return None
     
+    async def summarize_if_needed(
+        self,
+        state: AgentState,
+        evicted_upto: int,
+        max_tokens: int,
+        token_counts: Optional[List[int]] = None,
+        http_client: Any = None
+    ) -> Optional[str]:
+        """Fold messages that fell out of the history window into state["summary"].
+        
+        Messages before `evicted_upto` are no longer sent to the model. Once the
+        ones not yet summarized reach `max_tokens`, they are merged into the
+        rolling summary with a cheap model. Otherwise the cached summary is
+        returned unchanged, so most turns make no extra call. Pass per-message
+        `token_counts` when the caller already has them to skip re-tokenizing,
+        and the caller's pooled `http_client` so the summary model reuses its
+        connections instead of opening its own.
+        """
+        summary = state.get("summary")
+        start = state.get("summary_upto", 0)
+        evicted = state["messages"][start:evicted_upto]
+        if not evicted:
+            return summary
+        
+        if token_counts is not None:
+            evicted_tokens = sum(token_counts[start:evicted_upto])
+        else:
+            if self._summary_encoder is None:
+                self._summary_encoder = load_encoder(config.get_summary_model()) or False
+            encoder = self._summary_encoder or None
+            evicted_tokens = sum(count_tokens(str(msg.content), encoder) for msg in evicted)
+        if evicted_tokens < max_tokens:
+            return summary
+        
+        try:
+            if self._summary_model is None:
+                from langchain_openai import ChatOpenAI
+                self._summary_model = ChatOpenAI(
+                    model=config.get_summary_model(),
+                    temperature=0,
+                    api_key=config.get_openai_api_key(),
+                    http_async_client=http_client
+                )
+            
+            transcript = "\n".join(f"{type(msg).__name__}: {msg.content}" for msg in evicted)
+            if summary:
+                transcript = f"Previous summary:\n{summary}\n\nNew messages:\n{transcript}"
+            result = await self._summary_model.ainvoke([
+                SystemMessage(content=SUMMARY_PROMPT),
+                HumanMessage(content=transcript)
+            ])
+            
+            state["summary"] = result.content
+            state["summary_upto"] = evicted_upto
+            return state["summary"]
+        except Exception as e:
+            print(f"Error summarizing history: {e}")
+            return summary
+    
     def list_sessions(self) -> List[str]:
         """List all available session IDs."""
+        self.flush()
+        cached = self._sessions_cache
+        if cached is not None and time.monotonic() - cached[0] < SESSION_LIST_TTL:
+            return list(cached[1])
+        
         try:
-            files = os.listdir(self.storage_dir)
-            return [f.replace('.json', '') for f in files if f.endswith('.json')]
+            # One pass over cached dirents; snapshots are .msgpack.zst, or
+            # .msgpack / .json for sessions saved by earlier versions
+            sessions = {}
+            with os.scandir(self.storage_dir) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if name.endswith('.msgpack.zst'):
+                        session_id = name[:-12]
+                    elif name.endswith('.msgpack'):
+                        session_id = name[:-8]
+                    elif name.endswith('.json'):
+                        session_id = name[:-5]
+                    else:
+                        continue
+                    if entry.is_file(follow_symlinks=False):
+                        sessions[session_id] = None
+            
+            self._sessions_cache = (time.monotonic(), list(sessions))
+            return list(sessions)
         except Exception:
             return []
     
     def delete_session(self, session_id: str) -> bool:
         """Delete a session from memory."""
+        self.flush()
+        self._sessions_cache = None
         try:
-            file_path = os.path.join(self.storage_dir, f"{session_id}.json")
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                return True
-            return False
+            self._persisted_counts.pop(session_id, None)
+            self._append_counts.pop(session_id, None)
+            self._last_fields.pop(session_id, None)
+            self._unsynced_logs.discard(session_id)
+            self._close_log(session_id)
+            
+            deleted = False
+            file_paths = (
+                self._snapshot_path(session_id),
+                *self._legacy_snapshot_paths(session_id),
+                self._log_path(session_id),
+                self._legacy_log_path(session_id)
+            )
+            for file_path in file_paths:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                    deleted = True
+            return deleted
         except Exception as e:
             print(f"Error deleting session: {e}")
             return False
@@ -123,3 +645,5 @@ class SimpleMemoryManager:
 
 # Global memory manager instance
 memory_manager = SimpleMemoryManager()
+# Give open session logs their final fsync when the CLI or server exits
+atexit.register(memory_manager.close)
@@ -3,11 +3,19 @@ State management for the coding agent.
 Defines the minimal agent state structure.
 """
 
-from typing import TypedDict, List, Dict, Optional
+import time
+from typing import Any, TypedDict, List, Dict, Optional
 from datetime import datetime
+
+import msgspec
 from langchain_core.messages import BaseMessage
 
 
+# Longest error text kept in retry history and retry feedback; full stack
+# traces would otherwise be re-sent to the model and persisted on every retry
+MAX_ERROR_CHARS = 500
+
+
 class AgentState(TypedDict):
     """Minimal agent state for conversation and context management."""
     
@@ -25,26 +33,45 @@ class AgentState(TypedDict):
     retry_count: int  # Current retry attempt for this turn
     retry_history: List[Dict[str, str]]  # History of retry attempts with errors
     
+    # Rolling summary of messages evicted from the history window
+    summary: Optional[str]
+    summary_upto: int  # Messages before this index are covered by the summary
+    
     # Session metadata
     session_id: str
-    created_at: datetime
-    last_updated: datetime
+    created_at: int  # time.time_ns(); see format_timestamp
+    last_updated: int
 
 
-class ToolResult(TypedDict):
-    """Standardized result structure for all tools."""
+class ToolResult(msgspec.Struct):
+    """Standardized result structure for all tools.
+    
+    A slotted struct rather than a dict, so building one per tool call is cheap;
+    the optional fields default to None and are only filled in on failure.
+    """
     
     success: bool
-    data: Optional[any]
-    error: Optional[str]
-    error_type: Optional[str]
-    suggestions: Optional[List[str]]
-    metadata: Optional[Dict[str, any]]
+    data: Optional[Any] = None
+    error: Optional[str] = None
+    error_type: Optional[str] = None
+    suggestions: Optional[List[str]] = None
+    metadata: Optional[Dict[str, Any]] = None
+
+
+def format_timestamp(value: Any) -> str:
+    """Render a state timestamp as an ISO 8601 string.
+    
+    State timestamps are integer nanoseconds, which are far cheaper to take than
+    datetime.now(); they are only formatted when they leave the agent.
+    """
+    if isinstance(value, int):
+        return datetime.fromtimestamp(value / 1e9).isoformat()
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
 
 
 def create_initial_state(session_id: str) -> AgentState:
     """Create a new agent state for a session."""
-    now = datetime.now()
+    now = time.time_ns()
     
     return AgentState(
         messages=[],
@@ -53,6 +80,8 @@ def create_initial_state(session_id: str) -> AgentState:
         last_error=None,
         retry_count=0,
         retry_history=[],
+        summary=None,
+        summary_upto=0,
         session_id=session_id,
         created_at=now,
         last_updated=now
@@ -61,23 +90,32 @@ def create_initial_state(session_id: str) -> AgentState:
 
 def update_state_timestamp(state: AgentState) -> AgentState:
     """Update the last_updated timestamp in the state."""
-    state["last_updated"] = datetime.now()
+    state["last_updated"] = time.time_ns()
     return state
 
 
 def reset_retry_state(state: AgentState) -> AgentState:
     """Reset retry counter and history for a new user message."""
-    state["retry_count"] = 0
-    state["retry_history"] = []
+    # Most turns follow one that needed no retries; leave the state untouched then
+    if state.get("retry_count") or state.get("retry_history"):
+        state["retry_count"] = 0
+        state["retry_history"] = []
     return state
 
 
+def truncate_error(error: str, limit: int = MAX_ERROR_CHARS) -> str:
+    """Cut an error message to `limit` characters, marking the cut with an ellipsis."""
+    if len(error) <= limit:
+        return error
+    return error[:limit] + "…"
+
+
 def increment_retry_count(state: AgentState, error_info: Dict[str, str]) -> AgentState:
-    """Increment retry count and add error to history."""
+    """Increment retry count and add error (truncated) to history."""
     state["retry_count"] += 1
     state["retry_history"].append({
         "attempt": state["retry_count"],
-        "error": error_info.get("error", "Unknown error"),
+        "error": truncate_error(error_info.get("error", "Unknown error")),
         "error_type": error_info.get("error_type", "Unknown"),
         "timestamp": datetime.now().isoformat()
     })
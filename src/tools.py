@@ -4,9 +4,20 @@ Simple, safe operations with error handling.
 """
 
 import os
+import atexit
+import glob
+import select
+import shlex
+import shutil
+import signal
 import subprocess
+import tempfile
+import threading
+import time
 import traceback
-from pathlib import Path
+from functools import lru_cache
+from itertools import islice
+from stat import S_ISDIR, S_ISREG
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from langchain_core.tools import tool
@@ -15,38 +26,285 @@ from .config import config
 from .git_tools import GIT_TOOLS
 
 
+@lru_cache(maxsize=1)
+def _workspace_root() -> str:
+    """Workspace directory as a string, read from config once."""
+    return str(config.get_workspace_path())
+
+
+_POSIX = os.name == "posix"
+
+
 def _resolve_path(file_path: str) -> str:
-    """Resolve file path relative to workspace directory."""
-    path = Path(file_path)
-    if path.is_absolute():
-        return str(path)
-    else:
-        # Make path relative to workspace
-        workspace_path = config.get_workspace_path()
-        return str(workspace_path / path)
+    """Resolve file path relative to workspace directory.
+    
+    Works on plain strings, so the per-call cost is a prefix check and a join
+    rather than building Path objects. On POSIX the absolute check is a single
+    character comparison; Windows needs isabs for drive letters and UNC paths.
+    """
+    if file_path[:1] == "/" if _POSIX else os.path.isabs(file_path):
+        return file_path
+    if file_path in ("", "."):
+        return _workspace_root()
+    # Make path relative to workspace
+    return os.path.join(_workspace_root(), file_path)
+
+
+def _scan_directory(resolved_path: str) -> List[os.DirEntry]:
+    """Return a directory's entries sorted by name.
+    
+    scandir reports each entry's type from the directory read itself, so
+    telling files from directories costs no extra stat per entry.
+    """
+    try:
+        with os.scandir(resolved_path) as it:
+            return sorted(it, key=lambda entry: entry.name)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Directory not found: {resolved_path}") from None
+    except NotADirectoryError:
+        raise ValueError(f"Not a directory: {resolved_path}") from None
+
+
+# Stat results younger than this are reused; agents often probe the same path
+# several times in one turn ("exists? -> write -> exists? -> info")
+STAT_CACHE_TTL = 0.1
+MAX_STAT_CACHE = 256
+
+_stat_cache: Dict[str, tuple] = {}
+
+
+def _stat_cached(resolved_path: str) -> Optional[os.stat_result]:
+    """os.stat with a short-lived cache; None when the path does not exist."""
+    now = time.monotonic()
+    cached = _stat_cache.get(resolved_path)
+    if cached is not None and now - cached[0] < STAT_CACHE_TTL:
+        return cached[1]
+    
+    try:
+        result = os.stat(resolved_path)
+    except (OSError, ValueError):
+        # Same cases os.path.exists reports as missing
+        result = None
+    
+    if len(_stat_cache) >= MAX_STAT_CACHE:
+        _stat_cache.clear()
+    _stat_cache[resolved_path] = (now, result)
+    return result
+
+
+def _invalidate_stat(resolved_path: str):
+    """Drop the cached stat for a path the tools just modified."""
+    _stat_cache.pop(resolved_path, None)
+
+
+# O_BINARY keeps Windows from translating newlines at the descriptor level; 0 elsewhere
+_O_BINARY = getattr(os, "O_BINARY", 0)
+
+
+def _read_bytes(resolved_path: str) -> bytes:
+    """Read a whole file with one read sized from fstat."""
+    fd = os.open(resolved_path, os.O_RDONLY | _O_BINARY)
+    try:
+        size = os.fstat(fd).st_size
+        data = os.read(fd, size) if size else b""
+        if not size or len(data) < size:
+            # Short read (very large or growing file, or one that reports size 0): read to EOF
+            parts = [data]
+            while chunk := os.read(fd, 1 << 16):
+                parts.append(chunk)
+            data = b"".join(parts)
+    finally:
+        os.close(fd)
+    return data
+
+
+def _decode_text(data: bytes, errors: str = "strict") -> str:
+    """Decode UTF-8, normalizing newlines to \n as text-mode IO would.
+    
+    The normalization pass only runs when there is a carriage return to replace.
+    """
+    text = data.decode("utf-8", errors)
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def _read_text(resolved_path: str) -> str:
+    """Read a UTF-8 file, skipping the text-IO layer."""
+    return _decode_text(_read_bytes(resolved_path))
+
+
+def _write_text(resolved_path: str, content: str):
+    """Write a string to a file as UTF-8 through a raw descriptor."""
+    data = memoryview(content.encode("utf-8"))
+    fd = os.open(resolved_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | _O_BINARY, 0o666)
+    try:
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+
+
+def _kill_process_group(proc: subprocess.Popen):
+    """Kill a process started with start_new_session, and everything in its group."""
+    if not hasattr(os, "killpg"):
+        # No process groups off POSIX; start_new_session is ignored there too
+        proc.kill()
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+class _ShellSession:
+    """A long-lived /bin/sh that runs captured commands without a new shell per call.
+    
+    Each command is eval'd in a subshell with stdin from /dev/null and its
+    output redirected to temp files, so cd/export inside a command don't leak
+    into the next one, and only an exit-status sentinel crosses the pipe.
+    """
+    
+    SENTINEL = b"__AGENT_CMD_DONE__"
+    
+    def __init__(self, cwd: str):
+        self.cwd = cwd
+        self.lock = threading.Lock()
+        self._proc: Optional[subprocess.Popen] = None
+        self._tmp_dir = tempfile.mkdtemp(prefix="agent-shell-")
+        self._out_path = os.path.join(self._tmp_dir, "stdout")
+        self._err_path = os.path.join(self._tmp_dir, "stderr")
+    
+    def _start(self):
+        # Own process group, so a timeout can kill the command's children too
+        self._proc = subprocess.Popen(
+            ["/bin/sh"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=self.cwd,
+            start_new_session=True
+        )
+    
+    def close(self):
+        """Kill the shell and anything still running under it."""
+        proc, self._proc = self._proc, None
+        if proc is not None and proc.poll() is None:
+            _kill_process_group(proc)
+            proc.wait()
+    
+    def shutdown(self):
+        """Close the shell and remove its temp files (at interpreter exit)."""
+        self.close()
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+    
+    def _read_sentinel(self, deadline: Optional[float]) -> Optional[bytes]:
+        """Read the shell's stdout up to the sentinel line; None if the deadline passes first."""
+        fd = self._proc.stdout.fileno()
+        buffer = b""
+        while b"\n" not in buffer:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if ready:
+                chunk = os.read(fd, 4096)
+                if not chunk:
+                    raise RuntimeError("Shell session exited unexpectedly")
+                buffer += chunk
+        return buffer
+    
+    def run(self, command: str, timeout: Optional[float]) -> subprocess.CompletedProcess:
+        if self._proc is None or self._proc.poll() is not None:
+            self._start()
+        
+        script = (
+            f"( eval {shlex.quote(command)} ) </dev/null "
+            f">{shlex.quote(self._out_path)} 2>{shlex.quote(self._err_path)}; "
+            f"echo \"{self.SENTINEL.decode()}$?\"\n"
+        )
+        self._proc.stdin.write(script.encode())
+        self._proc.stdin.flush()
+        
+        line = self._read_sentinel(None if timeout is None else time.monotonic() + timeout)
+        if line is None:
+            self.close()
+            raise subprocess.TimeoutExpired(command, timeout)
+        
+        returncode = int(line.strip()[len(self.SENTINEL):])
+        return subprocess.CompletedProcess(
+            command, returncode, _read_bytes(self._out_path), _read_bytes(self._err_path)
+        )
+
+
+@lru_cache(maxsize=1)
+def _shell_session() -> Optional[_ShellSession]:
+    """The workspace's shared shell session, or None where /bin/sh isn't available."""
+    if os.name != "posix":
+        return None
+    session = _ShellSession(_workspace_root())
+    atexit.register(session.shutdown)
+    return session
+
+
+def _run_captured(command: str, timeout: Optional[float], working_dir: str) -> subprocess.CompletedProcess:
+    """Run a shell command capturing its output as raw bytes.
+    
+    Uses the shared shell session for workspace commands; other directories,
+    and calls made while the session is busy with a parallel tool call, get
+    their own shell, set up the same way: stdin from /dev/null and a process
+    group that is killed as a whole on timeout.
+    """
+    session = _shell_session()
+    if session is not None and working_dir == session.cwd and session.lock.acquire(blocking=False):
+        try:
+            return session.run(command, timeout)
+        finally:
+            session.lock.release()
+    
+    with subprocess.Popen(
+        command,
+        shell=True,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=working_dir,
+        start_new_session=True
+    ) as proc:
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            _kill_process_group(proc)
+            proc.wait()
+            raise
+    return subprocess.CompletedProcess(command, proc.returncode, stdout, stderr)
+
+
+class _LazyTraceback:
+    """Traceback of an exception, formatted only when converted to a string."""
+    
+    __slots__ = ("_exc",)
+    
+    def __init__(self, exc: BaseException):
+        self._exc = exc
+    
+    def __str__(self) -> str:
+        return "".join(traceback.format_exception(type(self._exc), self._exc, self._exc.__traceback__))
+    
+    __repr__ = __str__
 
 
 def safe_execute(tool_func, *args, **kwargs) -> ToolResult:
     """Safely execute a tool function with error handling."""
     try:
-        result = tool_func(*args, **kwargs)
-        return ToolResult(
-            success=True,
-            data=result,
-            error=None,
-            error_type=None,
-            suggestions=None,
-            metadata={"timestamp": datetime.now().isoformat()}
-        )
+        return ToolResult(success=True, data=tool_func(*args, **kwargs))
     except Exception as e:
         return ToolResult(
             success=False,
-            data=None,
             error=str(e),
             error_type=type(e).__name__,
-            suggestions=None,
             metadata={
-                "traceback": traceback.format_exc(),
+                "traceback": _LazyTraceback(e),
                 "timestamp": datetime.now().isoformat()
             }
         )
@@ -59,9 +317,7 @@ def read_file(file_path: str) -> str:
     Args:
         file_path: Path to the file to read
     """
-    resolved_path = _resolve_path(file_path)
-    with open(resolved_path, 'r', encoding='utf-8') as f:
-        return f.read()
+    return _read_text(_resolve_path(file_path))
 
 
 @tool
@@ -79,14 +335,14 @@ def write_file(file_path: str, content: str) -> bool:
     if dir_path:  # Only create directory if there's actually a directory part
         os.makedirs(dir_path, exist_ok=True)
     
-    with open(resolved_path, 'w', encoding='utf-8') as f:
-        f.write(content)
+    _write_text(resolved_path, content)
+    _invalidate_stat(resolved_path)
     return True
 
 
 @tool
 def edit_file(file_path: str, old_content: str, new_content: str) -> bool:
-    """Edit a file by replacing old_content with new_content.
+    """Edit a file by replacing the first occurrence of old_content with new_content.
     
     Args:
         file_path: Path to the file to edit
@@ -95,19 +351,25 @@ def edit_file(file_path: str, old_content: str, new_content: str) -> bool:
     """
     resolved_path = _resolve_path(file_path)
     
-    if not os.path.exists(resolved_path):
-        raise FileNotFoundError(f"File not found: {resolved_path}")
+    # Let the open itself report a missing file instead of checking first
+    try:
+        f = open(resolved_path, 'r+', encoding='utf-8')
+    except FileNotFoundError:
+        raise FileNotFoundError(f"File not found: {resolved_path}") from None
     
-    with open(resolved_path, 'r', encoding='utf-8') as f:
+    # Read and rewrite through the one descriptor rather than reopening for the write
+    with f:
         current_content = f.read()
-    
-    if old_content not in current_content:
-        raise ValueError(f"Old content not found in file: {resolved_path}")
-    
-    updated_content = current_content.replace(old_content, new_content)
-    
-    with open(resolved_path, 'w', encoding='utf-8') as f:
-        f.write(updated_content)
+        
+        # One scan finds the match; slicing around it avoids a second pass with replace()
+        index = current_content.find(old_content)
+        if index < 0:
+            raise ValueError(f"Old content not found in file: {resolved_path}")
+        
+        f.seek(0)
+        f.write(current_content[:index] + new_content + current_content[index + len(old_content):])
+        f.truncate()
+    _invalidate_stat(resolved_path)
     
     return True
 
@@ -131,16 +393,20 @@ def run_command(command: str, timeout: int = None, working_dir: str = None, show
     
     # Default to workspace directory for command execution
     if working_dir is None:
-        working_dir = str(config.get_workspace_path())
+        working_dir = _workspace_root()
     
     if show_output:
         # Don't capture output - let it stream directly to terminal for real-time display
-        result = subprocess.run(
-            command,
-            shell=True,
-            timeout=timeout,
-            cwd=working_dir
-        )
+        try:
+            result = subprocess.run(
+                command,
+                shell=True,
+                timeout=timeout,
+                cwd=working_dir
+            )
+        finally:
+            # A command can create or delete anything, so cached stats can't be trusted past it
+            _stat_cache.clear()
         
         if result.returncode != 0:
             raise RuntimeError(f"Command failed with exit code {result.returncode}")
@@ -148,41 +414,38 @@ def run_command(command: str, timeout: int = None, working_dir: str = None, show
         return "Command executed successfully (output displayed in terminal)"
     else:
         # Capture output for return value and error context
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            cwd=working_dir
-        )
+        try:
+            result = _run_captured(command, timeout, working_dir)
+        finally:
+            _stat_cache.clear()
         
         if result.returncode != 0:
             # Include both stdout and stderr for context, truncate to last 500 chars to avoid token bloat
             error_msg = f"Command failed with exit code {result.returncode}"
             
+            # Slice the raw bytes first so only the kept tail is decoded
             if result.stdout:
-                stdout_truncated = result.stdout[-500:] if len(result.stdout) > 500 else result.stdout
-                error_msg += f"\nOutput: {stdout_truncated}"
+                error_msg += f"\nOutput: {_decode_text(result.stdout[-500:], 'replace')}"
             
             if result.stderr:
-                stderr_truncated = result.stderr[-500:] if len(result.stderr) > 500 else result.stderr
-                error_msg += f"\nError: {stderr_truncated}"
+                error_msg += f"\nError: {_decode_text(result.stderr[-500:], 'replace')}"
             
             raise RuntimeError(error_msg)
         
-        return result.stdout
+        return _decode_text(result.stdout, 'replace')
 
 
 @tool
-def list_files(pattern: str = "*") -> List[str]:
-    """List files matching a pattern.
+def list_files(pattern: str = "*", limit: Optional[int] = None) -> List[str]:
+    """List files matching a pattern, relative to the workspace.
     
     Args:
-        pattern: Glob pattern to match files (default: "*")
+        pattern: Glob pattern to match files (default: "*"); use "**" to match across directories
+        limit: Maximum number of matches to return (default: all)
     """
-    import glob
-    return glob.glob(pattern)
+    # iglob yields matches lazily, so a limit stops the directory walk early
+    matches = glob.iglob(pattern, root_dir=_workspace_root(), recursive=True)
+    return list(islice(matches, limit))
 
 
 @tool
@@ -192,8 +455,7 @@ def file_exists(file_path: str) -> bool:
     Args:
         file_path: Path to check
     """
-    resolved_path = _resolve_path(file_path)
-    return os.path.exists(resolved_path)
+    return _stat_cached(_resolve_path(file_path)) is not None
 
 
 @tool
@@ -205,16 +467,17 @@ def get_file_info(file_path: str) -> Dict[str, Any]:
     """
     resolved_path = _resolve_path(file_path)
     
-    if not os.path.exists(resolved_path):
+    stat = _stat_cached(resolved_path)
+    if stat is None:
         raise FileNotFoundError(f"File not found: {resolved_path}")
     
-    stat = os.stat(resolved_path)
+    # The type bits of the one stat answer is_file/is_dir without further syscalls
     return {
         "path": resolved_path,
         "size": stat.st_size,
         "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-        "is_file": os.path.isfile(resolved_path),
-        "is_dir": os.path.isdir(resolved_path)
+        "is_file": S_ISREG(stat.st_mode),
+        "is_dir": S_ISDIR(stat.st_mode)
     }
 
 
@@ -225,8 +488,7 @@ def get_current_directory() -> str:
     Returns the absolute path of the workspace directory where all operations are performed.
     This is useful to understand your current location in the filesystem.
     """
-    workspace_path = config.get_workspace_path()
-    return str(workspace_path)
+    return _workspace_root()
 
 
 @tool
@@ -240,26 +502,17 @@ def list_directory(directory_path: str = ".") -> Dict[str, Any]:
         Dictionary with files and directories lists plus the absolute path
     """
     resolved_path = _resolve_path(directory_path)
-    
-    if not os.path.exists(resolved_path):
-        raise FileNotFoundError(f"Directory not found: {resolved_path}")
-    
-    if not os.path.isdir(resolved_path):
-        raise ValueError(f"Not a directory: {resolved_path}")
-    
-    entries = os.listdir(resolved_path)
+    entries = _scan_directory(resolved_path)
     
     files = []
     directories = []
     
-    for entry in sorted(entries):
-        full_path = os.path.join(resolved_path, entry)
-        if os.path.isdir(full_path):
-            directories.append(entry)
+    for entry in entries:
+        if entry.is_dir():
+            directories.append(entry.name)
         else:
             # Include file size for files
-            size = os.path.getsize(full_path)
-            files.append(f"{entry} ({size} bytes)")
+            files.append(f"{entry.name} ({entry.stat().st_size} bytes)")
     
     return {
         "path": resolved_path,
@@ -285,20 +538,14 @@ def change_workspace_context(new_path: str) -> str:
     """
     resolved_path = _resolve_path(new_path)
     
-    if not os.path.exists(resolved_path):
-        raise FileNotFoundError(f"Directory not found: {resolved_path}")
-    
-    if not os.path.isdir(resolved_path):
-        raise ValueError(f"Not a directory: {resolved_path}")
-    
     # Get directory contents
-    entries = os.listdir(resolved_path)
-    files = [e for e in entries if os.path.isfile(os.path.join(resolved_path, e))]
-    dirs = [e for e in entries if os.path.isdir(os.path.join(resolved_path, e))]
+    entries = _scan_directory(resolved_path)
+    files = [e.name for e in entries if e.is_file()]
+    dirs = [e.name for e in entries if e.is_dir()]
     
     return f"""Directory: {resolved_path}
-Subdirectories ({len(dirs)}): {', '.join(sorted(dirs)) if dirs else 'none'}
-Files ({len(files)}): {', '.join(sorted(files)) if files else 'none'}
+Subdirectories ({len(dirs)}): {', '.join(dirs) if dirs else 'none'}
+Files ({len(files)}): {', '.join(files) if files else 'none'}
 
 You can now work with files in this directory using relative paths like:
 - read_file("{new_path}/filename.txt")
@@ -1,21 +1,39 @@
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-import json
 import asyncio
+import logging
+import msgspec
+import orjson
 import os
+import time
+import traceback
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
 # Import your existing agent
 import sys
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+ROOT_DIR = str(Path(__file__).resolve().parents[2])
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
 from src.agent import get_agent
 from src.config import config
 from src.memory import memory_manager
+from tree import build_tree
 
-app = FastAPI()
+class OrjsonResponse(JSONResponse):
+    """JSON response encoded with orjson rather than the stdlib json module."""
+    
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+# Endpoints return OrjsonResponse themselves for their plain str/int payloads,
+# which also skips FastAPI's jsonable_encoder pass over the returned dict
+app = FastAPI(default_response_class=OrjsonResponse)
+logger = logging.getLogger(__name__)
 
 # CORS for local development
 app.add_middleware(
@@ -26,6 +44,66 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# The workspace is fixed once config loads
+WORKSPACE = str(config.get_workspace_path())
+
+# Health probes get the same answer for the life of the process, so it's encoded once
+HEALTH_BODY = orjson.dumps({
+    "status": "healthy",
+    "workspace": WORKSPACE,
+    "model": config.get_model_config()["model_name"]
+})
+
+# Headers sent with every chat stream, built once
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    # Stop nginx-style reverse proxies from buffering the stream
+    "X-Accel-Buffering": "no",
+    "Access-Control-Allow-Origin": "http://localhost:3000",
+    "Access-Control-Allow-Credentials": "true",
+}
+
+def sse(event: dict) -> bytes:
+    """Frame an event as one SSE data message, encoded once with orjson."""
+    return b"data: " + orjson.dumps(event, option=orjson.OPT_NON_STR_KEYS) + b"\n\n"
+
+@lru_cache(maxsize=256)
+def done_frame(session_id: Optional[str]) -> bytes:
+    """Completion frame for a session; a session's later turns reuse the encoded bytes."""
+    return sse({
+        "event": "done",
+        "data": {
+            "session_id": session_id
+        }
+    })
+
+# Events buffered between the agent and the client before the agent has to wait
+STREAM_QUEUE_SIZE = 64
+
+# Queued after the agent's last event
+_STREAM_END = object()
+
+async def pump_events(agent, message: str, queue: asyncio.Queue):
+    """Feed the agent's streamed events into `queue`, then _STREAM_END.
+    
+    An exception from the agent is queued in place of the end marker so the
+    SSE loop reports it as before.
+    """
+    try:
+        async for event in agent.astream_response(message):
+            await queue.put(event)
+    except Exception as e:
+        await queue.put(e)
+    else:
+        await queue.put(_STREAM_END)
+
+def token_chunk(event):
+    """Message chunk carried by an on_chat_model_stream event; None for anything else."""
+    if isinstance(event, dict) and event.get("event") == "on_chat_model_stream":
+        return event.get("data", {}).get("chunk")
+    return None
+
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
@@ -42,112 +120,126 @@ async def chat_stream(request: ChatRequest):
     elif not agent.current_session_id:
         agent.start_session()
     
-    async def event_generator():
+    # The agent and message are passed in as arguments so the generator reads
+    # them as locals rather than through closure cells
+    async def event_generator(agent, message: str):
+        # The agent runs as its own task feeding a bounded queue, so its work
+        # doesn't wait on each frame being flushed and a slow client pushes back
+        queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        producer = asyncio.create_task(pump_events(agent, message, queue))
         try:
-            # Stream events from agent
-            async for event in agent.astream_response(request.message):
+            event = await queue.get()
+            while event is not _STREAM_END:
+                if isinstance(event, Exception):
+                    raise event
+                
                 event_type = event.get('event')
-                # Debug: print event type
-                print(f"[SSE] Sending event: {event_type}")
+                # Per-event logging is debug-only; printing every token held up the stream
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("SSE event %s", event_type)
                 
-                # Create a JSON-serializable version of the event
-                try:
-                    # Try to serialize the whole event
-                    json.dumps(event)
-                    # If successful, send as-is
-                    yield f"data: {json.dumps(event)}\n\n"
-                except (TypeError, ValueError) as e:
-                    # If not serializable, send a simplified version
-                    simplified_event = {
-                        "event": event_type,
-                        "name": event.get("name", ""),
-                        "run_id": event.get("run_id", "")
-                    }
-                    # For chat model streams, extract the content
-                    if event_type == "on_chat_model_stream":
-                        chunk = event.get("data", {}).get("chunk", {})
-                        if hasattr(chunk, 'content'):
-                            simplified_event["data"] = {"chunk": {"content": chunk.content}}
-                        else:
-                            simplified_event["data"] = {"chunk": {"content": str(chunk)}}
+                next_event = None
+                chunk = token_chunk(event)
+                if hasattr(chunk, 'content'):
+                    content = chunk.content
+                    # Fold in text chunks from the same run that are already queued, so a
+                    # fast model sends fewer frames; nothing is waited for, so the first
+                    # token still goes out immediately
+                    while isinstance(content, str) and not queue.empty():
+                        next_event = queue.get_nowait()
+                        next_chunk = token_chunk(next_event)
+                        if not isinstance(getattr(next_chunk, 'content', None), str) or next_event.get("run_id") != event.get("run_id"):
+                            break
+                        content += next_chunk.content
+                        next_event = None
                     
-                    yield f"data: {json.dumps(simplified_event)}\n\n"
+                    # Tool-call deltas arrive as chunks with no text; the UI has nothing to show
+                    if content:
+                        # Token chunks dominate the stream and carry message objects that never
+                        # serialize as-is, so build their frame directly instead of failing first
+                        yield sse({
+                            "event": event_type,
+                            "name": event.get("name", ""),
+                            "run_id": event.get("run_id", ""),
+                            "data": {"chunk": {"content": content}}
+                        })
+                else:
+                    # Serialize the whole event once; orjson raises TypeError if it can't
+                    try:
+                        payload = sse(event)
+                    except TypeError:
+                        # If not serializable, send a simplified version
+                        simplified_event = {
+                            "event": event_type,
+                            "name": event.get("name", ""),
+                            "run_id": event.get("run_id", "")
+                        }
+                        # Chat model chunks without a content attribute are sent as text
+                        if event_type == "on_chat_model_stream":
+                            simplified_event["data"] = {"chunk": {"content": str(event.get("data", {}).get("chunk", {}))}}
+                        
+                        payload = sse(simplified_event)
+                    
+                    yield payload
                 
-                await asyncio.sleep(0)  # Yield control
+                event = next_event if next_event is not None else await queue.get()
             
             # Send completion with session info
-            completion = {
-                "event": "done",
-                "data": {
-                    "session_id": agent.current_session_id
-                }
-            }
-            yield f"data: {json.dumps(completion)}\n\n"
+            yield done_frame(agent.current_session_id)
         except Exception as e:
-            import traceback
-            error_details = traceback.format_exc()
             print(f"[ERROR] Exception in event_generator: {str(e)}")
-            print(error_details)
             error = {
                 "event": "error",
                 "data": {
                     "error": str(e),
-                    "type": type(e).__name__,
-                    "traceback": error_details
+                    "type": type(e).__name__
                 }
             }
-            yield f"data: {json.dumps(error)}\n\n"
+            # Formatting the stack is costly and exposes server internals to the
+            # browser, so it's only done when debugging
+            if config.get_debug():
+                error_details = traceback.format_exc()
+                print(error_details)
+                error["data"]["traceback"] = error_details
+            yield sse(error)
+        finally:
+            # Stops the agent straight away if the client disconnected mid-stream
+            producer.cancel()
     
     return StreamingResponse(
-        event_generator(),
+        event_generator(agent, request.message),
         media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Access-Control-Allow-Origin": "http://localhost:3000",
-            "Access-Control-Allow-Credentials": "true",
-        }
+        headers=SSE_HEADERS
     )
 
 # 2. FILE TREE ENDPOINT
+# How long a built tree is served again while the workspace root is unchanged.
+# The root's mtime only moves when its direct entries change, so deeper edits
+# show up once this expires
+TREE_CACHE_TTL = 1.0
+
+# (workspace, root mtime_ns, built at, JSON body) of the last tree served
+_tree_cache: Optional[tuple] = None
+
+def tree_response_body(root: str) -> bytes:
+    """Walk the workspace and return the tree endpoint's JSON body, reusing a fresh cached one."""
+    global _tree_cache
+    mtime_ns = os.stat(root).st_mtime_ns
+    now = time.monotonic()
+    cached = _tree_cache
+    if cached is not None and cached[:2] == (root, mtime_ns) and now - cached[2] < TREE_CACHE_TTL:
+        return cached[3]
+    
+    body = msgspec.json.encode({"root": root, "children": build_tree(root)})
+    _tree_cache = (root, mtime_ns, now, body)
+    return body
+
 @app.get("/api/workspace/tree")
 async def get_file_tree():
     """Get workspace directory structure."""
-    workspace = config.get_workspace_path()
-    
-    def build_tree(path: Path, max_depth=3, current_depth=0):
-        """Recursively build directory tree."""
-        if current_depth >= max_depth:
-            return None
-        
-        try:
-            items = []
-            for item in sorted(path.iterdir()):
-                # Skip hidden files and __pycache__
-                if item.name.startswith('.') or item.name == '__pycache__':
-                    continue
-                
-                node = {
-                    "name": item.name,
-                    "path": str(item.relative_to(workspace)),
-                    "type": "directory" if item.is_dir() else "file"
-                }
-                
-                if item.is_file():
-                    node["size"] = item.stat().st_size
-                elif item.is_dir():
-                    children = build_tree(item, max_depth, current_depth + 1)
-                    if children:
-                        node["children"] = children
-                
-                items.append(node)
-            
-            return items
-        except PermissionError:
-            return []
-    
-    tree = build_tree(workspace)
-    return {"root": str(workspace), "children": tree or []}
+    # The walk is blocking filesystem I/O; keep it off the event loop serving the chat streams
+    body = await run_in_threadpool(tree_response_body, WORKSPACE)
+    return Response(body, media_type="application/json")
 
 # 3. SESSION METRICS ENDPOINT
 @app.get("/api/metrics/{session_id}")
@@ -160,38 +252,36 @@ async def get_session_metrics(session_id: str):
     
     info = agent.get_session_info()
     
-    return {
+    return OrjsonResponse({
         "session_id": session_id,
         "turn_number": info.get("message_count", 0) // 2,
         "message_count": info.get("message_count", 0),
         "files_in_context": info.get("files_in_context", 0),
         "created_at": info.get("created_at"),
         "last_updated": info.get("last_updated")
-    }
+    })
 
 # 4. SESSION MANAGEMENT
 @app.get("/api/sessions")
 async def list_sessions():
     """List all available sessions."""
     sessions = memory_manager.list_sessions()
-    return {"sessions": sessions}
+    return OrjsonResponse({"sessions": sessions})
 
 @app.post("/api/sessions")
 async def create_session():
     """Create a new session."""
     agent = get_agent()
     session_id = agent.start_session()
-    return {"session_id": session_id}
+    return OrjsonResponse({"session_id": session_id})
 
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint."""
-    return {
-        "status": "healthy",
-        "workspace": str(config.get_workspace_path()),
-        "model": config.get_model_config()["model_name"]
-    }
+    return Response(HEALTH_BODY, media_type="application/json")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # uvicorn[standard] installs uvloop and httptools; "auto" picks them up when
+    # present and falls back to asyncio/h11 where they aren't (e.g. uvloop on Windows)
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="auto", http="auto")
\ No newline at end of file
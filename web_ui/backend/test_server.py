@@ -3,11 +3,14 @@ import sys
 from pathlib import Path
 
 # Add parent directory to path
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+ROOT_DIR = str(Path(__file__).resolve().parents[2])
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
 
 from src.agent import get_agent
 from src.config import config
 from src.memory import memory_manager
+from tree import build_tree
 
 print("=" * 60)
 print("Backend Server Test")
@@ -54,41 +57,12 @@ except Exception as e:
 # Test 5: File tree building
 print("\n✓ Testing file tree building...")
 try:
-    from pathlib import Path
     workspace = config.get_workspace_path()
     
-    def build_tree(path: Path, max_depth=2, current_depth=0):
-        if current_depth >= max_depth:
-            return None
-        
-        try:
-            items = []
-            for item in sorted(path.iterdir()):
-                if item.name.startswith('.') or item.name == '__pycache__':
-                    continue
-                
-                node = {
-                    "name": item.name,
-                    "type": "directory" if item.is_dir() else "file"
-                }
-                
-                if item.is_file():
-                    node["size"] = item.stat().st_size
-                elif item.is_dir():
-                    children = build_tree(item, max_depth, current_depth + 1)
-                    if children:
-                        node["children"] = children
-                
-                items.append(node)
-            
-            return items
-        except PermissionError:
-            return []
-    
-    tree = build_tree(workspace)
+    tree = build_tree(str(workspace), max_depth=2)
     print(f"  Found {len(tree)} items in workspace")
     if tree:
-        print(f"  First item: {tree[0]['name']} ({tree[0]['type']})")
+        print(f"  First item: {tree[0].name} ({tree[0].type})")
 except Exception as e:
     print(f"  ✗ Error: {e}")
 
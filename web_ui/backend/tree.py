@@ -0,0 +1,73 @@
+"""Workspace file tree shared by the backend server and its test script."""
+import os
+from collections import deque
+from typing import List, Optional
+
+import msgspec
+
+
+class TreeNode(msgspec.Struct, omit_defaults=True, gc=False):
+    """One workspace entry; a slotted struct is far smaller than a per-node dict.
+    
+    Fields left at None are omitted when encoded, so files carry a size and
+    non-empty directories their children, as in the JSON the UI reads.
+    """
+    
+    name: str
+    path: str
+    type: str
+    size: Optional[int] = None
+    children: Optional[List["TreeNode"]] = None
+
+
+# Most entries the tree endpoint lists; bounds the walk and the response on huge workspaces
+MAX_TREE_ENTRIES = 10000
+
+
+def build_tree(root: str, max_depth=3, max_entries=MAX_TREE_ENTRIES):
+    """Build the directory tree down to max_depth levels.
+    
+    Walks breadth-first from an explicit queue rather than recursing, so deep
+    trees cost no Python frames per directory. os.scandir reports each entry's
+    type from the directory read itself, so only files pay for a stat (to get
+    their size). Past max_entries the walk stops; being breadth-first, it is
+    the deepest levels that get left out.
+    """
+    tree = []
+    count = 0
+    # (directory, its path relative to root, list to fill, node owning that list, depth)
+    pending = deque([(root, "", tree, None, 0)])
+    
+    while pending:
+        path, rel_path, items, parent, depth = pending.popleft()
+        try:
+            with os.scandir(path) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+            for entry in entries:
+                # Skip hidden files and __pycache__
+                if entry.name.startswith('.') or entry.name == '__pycache__':
+                    continue
+                if count >= max_entries:
+                    pending.clear()
+                    break
+                count += 1
+                
+                is_dir = entry.is_dir()
+                node = TreeNode(entry.name, os.path.join(rel_path, entry.name), "directory" if is_dir else "file")
+                
+                if entry.is_file():
+                    node.size = entry.stat().st_size
+                elif is_dir and depth + 1 < max_depth:
+                    pending.append((entry.path, node.path, [], node, depth + 1))
+                
+                items.append(node)
+        except PermissionError:
+            # An unreadable directory lists as empty
+            items.clear()
+            continue
+        
+        # Empty directories get no children key
+        if parent is not None and items:
+            parent.children = items
+    
+    return tree